@@ -1,23 +1,141 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, bindparam, case, event, extract, func, insert, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import click
+from werkzeug.security import generate_password_hash
+import hashlib
+import hmac
 import os
+import threading
+import time
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
+from search_index import RoomSearchIndex
+from serializers import Join, ListSerializer, isoformat
+from streaming import cached_json_list_response, json_list_response, stream_response
+from events import ChangeFeed
+from export import FORMATS as EXPORT_FORMATS, export_chunks, merge_tiers
+from group_commit import GroupCommitter
+from cache import SQLiteCache, TTLCache
+from classifier import ReasonClassifier
+from db_profile import READ_BIND, RoutingSession, apply_profile, engine_options, read_bind, read_only
+from identity import PasswordPool, PasswordPoolBusy
+from metrics import Instrumentation
+from notifications import NotificationDispatcher
+from migrations import apply_migrations, full_table_scans, pending_migrations
+from quantiles import QuantileSketch
+from pagination import decode_cursor, encode_cursor, make_etag, not_modified, page_args, set_validators
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///ward_lab.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=8)
+def _default_directory_cache_path(app):
+    digest = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    return os.path.join(app.instance_path, f'directory_cache_{digest}.sqlite')
 
-db = SQLAlchemy(app)
-jwt = JWTManager(app)
-CORS(app)
+def load_config(app):
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///ward_lab.db')
+    # 'wal' runs SQLite in WAL mode with the pragmas below on every
+    # connection (see db_profile.py); 'stock' keeps the driver defaults
+    app.config['DATABASE_PROFILE'] = os.getenv('DATABASE_PROFILE', 'wal')
+    app.config['DATABASE_BUSY_TIMEOUT_MS'] = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', '32768'))
+    # Connections per worker process. 0 sizes the pool from WORKER_THREADS
+    # (gunicorn --threads) plus the background threads.
+    app.config['WORKER_THREADS'] = int(os.getenv('WORKER_THREADS', '1'))
+    app.config['DATABASE_POOL_SIZE'] = int(os.getenv('DATABASE_POOL_SIZE', '0'))
+    app.config['DATABASE_MAX_OVERFLOW'] = int(os.getenv('DATABASE_MAX_OVERFLOW', '10'))
+    app.config['DATABASE_POOL_TIMEOUT'] = float(os.getenv('DATABASE_POOL_TIMEOUT', '30'))
+    # Separate pool for @read_only views (0 = off). DATABASE_READ_URL
+    # defaults to the primary database.
+    app.config['DATABASE_READ_POOL_SIZE'] = int(os.getenv('DATABASE_READ_POOL_SIZE', '0'))
+    app.config['DATABASE_READ_URL'] = os.getenv('DATABASE_READ_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=8)
+    # Seconds a worker may serve a user's cached identity before re-reading it
+    app.config['IDENTITY_CACHE_TTL'] = float(os.getenv('IDENTITY_CACHE_TTL', '300'))
+    # Password hashing threads per worker, how many request threads may wait
+    # on them at once (default half of WORKER_THREADS, so sign-ins cannot take
+    # every thread) and how many seconds each waits before a 503
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', '4'))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv(
+        'PASSWORD_HASH_MAX_PENDING', str(max(1, app.config['WORKER_THREADS'] // 2))))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+    # Per-request latency/SQL instrumentation served on /metrics (optionally
+    # behind a bearer token); requests slower than SLOW_REQUEST_MS are logged
+    # with their SQL (0 disables the log)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', '0'))
+    # Ward/room directory responses: entries kept per worker, and a SQLite file
+    # shared by the workers on this host (default: one per database in the
+    # app's instance folder; set DIRECTORY_CACHE_PATH= to turn the shared level off)
+    app.config['DIRECTORY_CACHE_SIZE'] = int(os.getenv('DIRECTORY_CACHE_SIZE', '256'))
+    app.config['DIRECTORY_CACHE_PATH'] = os.getenv('DIRECTORY_CACHE_PATH', _default_directory_cache_path(app))
+    app.config['DIRECTORY_CACHE_SHARED_SIZE'] = int(os.getenv('DIRECTORY_CACHE_SHARED_SIZE', '1024'))
+    # Seconds each worker reuses a dashboard summary for the same ward scope
+    app.config['DASHBOARD_CACHE_SECONDS'] = float(os.getenv('DASHBOARD_CACHE_SECONDS', '10'))
+    # Max age (seconds) of the in-memory room search index before it picks up
+    # rooms written by other workers
+    app.config['SEARCH_INDEX_REFRESH_SECONDS'] = float(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', '5'))
+    # How often each worker polls add_on_log for the add-on change feed
+    app.config['CHANGE_FEED_POLL_SECONDS'] = float(os.getenv('CHANGE_FEED_POLL_SECONDS', '1'))
+    # Coalesce concurrent add-on writes into shared transactions (group commit)
+    app.config['ADDON_GROUP_COMMIT'] = os.getenv('ADDON_GROUP_COMMIT', '0') == '1'
+    app.config['GROUP_COMMIT_MAX_BATCH'] = int(os.getenv('GROUP_COMMIT_MAX_BATCH', '64'))
+    app.config['GROUP_COMMIT_MAX_WAIT_MS'] = float(os.getenv('GROUP_COMMIT_MAX_WAIT_MS', '5'))
+    # Seconds a request waits for its group transaction before failing
+    app.config['GROUP_COMMIT_TIMEOUT'] = float(os.getenv('GROUP_COMMIT_TIMEOUT', '30'))
+    # Most operations one POST /api/addon-requests/batch may carry
+    app.config['ADDON_BATCH_MAX_OPERATIONS'] = int(os.getenv('ADDON_BATCH_MAX_OPERATIONS', '500'))
+    # Reason classification rules, a JSON list of {"category", "preventable",
+    # "keywords"}; empty uses classifier.DEFAULT_RULES. After changing them run
+    # `flask reclassify-addon-reasons`.
+    app.config['ADDON_REASON_RULES'] = os.getenv('ADDON_REASON_RULES')
+    # Completed/rejected add-on requests older than this many days (minimum 1)
+    # move to the archive tables when `flask archive-addon-requests` runs,
+    # in transactions of ADDON_ARCHIVE_BATCH_SIZE requests
+    app.config['ADDON_ARCHIVE_AFTER_DAYS'] = int(os.getenv('ADDON_ARCHIVE_AFTER_DAYS', '90'))
+    app.config['ADDON_ARCHIVE_BATCH_SIZE'] = int(os.getenv('ADDON_ARCHIVE_BATCH_SIZE', '500'))
+    # Notification delivery: provider (log, twilio, fake) and dispatcher threads per worker
+    app.config['NOTIFICATION_PROVIDER'] = os.getenv('NOTIFICATION_PROVIDER', 'log')
+    app.config['NOTIFICATION_WORKERS'] = int(os.getenv('NOTIFICATION_WORKERS', '1'))
+    app.config['NOTIFICATION_RECIPIENTS'] = os.getenv('NOTIFICATION_RECIPIENTS')  # JSON: {"role:lab_staff": ["+1..."]}
+    app.config['TWILIO_ACCOUNT_SID'] = os.getenv('TWILIO_ACCOUNT_SID')
+    app.config['TWILIO_AUTH_TOKEN'] = os.getenv('TWILIO_AUTH_TOKEN')
+    app.config['TWILIO_FROM_NUMBER'] = os.getenv('TWILIO_FROM_NUMBER')
+    # Run the 7 AM / 7 PM shift handover from a background thread in each worker
+    app.config['SHIFT_HANDOVER_SCHEDULER'] = os.getenv('SHIFT_HANDOVER_SCHEDULER', '0') == '1'
+    # Handovers (scheduled or `flask shift-handover`) run only this long after a
+    # shift boundary; a worker started within it still runs the missed handover
+    app.config['SHIFT_HANDOVER_GRACE_MINUTES'] = int(os.getenv('SHIFT_HANDOVER_GRACE_MINUTES', '60'))
+    # IANA zone whose wall clock the 7 AM / 7 PM boundaries follow; stored
+    # timestamps stay UTC
+    app.config['SHIFT_TIMEZONE'] = os.getenv('SHIFT_TIMEZONE', 'UTC')
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+jwt = JWTManager()
+# Every route and CLI command lives on this blueprint; create_app() registers it
+bp = Blueprint('api', __name__, cli_group=None)
+
+# Per-process services, configured by create_app(). None of them opens a
+# connection or starts a thread until first used.
+instrumentation = Instrumentation(skip_endpoints=('api.get_metrics',))
+room_search_index = RoomSearchIndex()
+identity_cache = TTLCache()
+dashboard_cache = TTLCache(maxsize=1000)
+# Keys carry the directory version, so the TTL only frees old versions
+directory_cache = TTLCache(ttl=3600)
+directory_shared_cache = SQLiteCache()
+password_pool = PasswordPool()
+reason_classifier = ReasonClassifier()
 
 # Database Models
 class User(db.Model):
@@ -51,6 +169,15 @@ class Room(db.Model):
     updated_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     ward = db.relationship('Ward', backref=db.backref('rooms', lazy=True))
+    
+    __table_args__ = (db.Index('ix_room_ward', 'ward_id'),)
+
+# Single row (id 1) bumped in the same transaction as every ward or room
+# change. Cached directory responses and the search index are keyed by it.
+class DirectoryVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class AddOnRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -72,11 +199,26 @@ class AddOnRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     reviewed_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
+    # Seconds from created_at to reviewed_at and to completed_at, stored
+    # with those timestamps for the turnaround analytics
+    review_seconds = db.Column(db.Integer)
+    complete_seconds = db.Column(db.Integer)
+    # Set from reason by reason_classifier when the request is created
+    reason_category = db.Column(db.String(50))
+    preventable = db.Column(db.Boolean)
     
     ward = db.relationship('Ward', backref=db.backref('addon_requests', lazy=True))
     room = db.relationship('Room', backref=db.backref('addon_requests', lazy=True))
     requester = db.relationship('User', foreign_keys=[requested_by], backref='addon_requests_made')
     reviewer = db.relationship('User', foreign_keys=[reviewed_by], backref='addon_requests_reviewed')
+    
+    __table_args__ = (
+        db.Index('ix_add_on_request_status_created', 'status', 'created_at'),
+        db.Index('ix_add_on_request_ward_status_created', 'ward_id', 'status', 'created_at'),
+        db.Index('ix_add_on_request_created', 'created_at'),
+        db.Index('ix_add_on_request_completed', 'completed_at'),
+        db.Index('ix_add_on_request_category_created', 'reason_category', 'created_at'),
+    )
 
 class AddOnLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -88,9 +230,202 @@ class AddOnLog(db.Model):
     
     request = db.relationship('AddOnRequest', backref=db.backref('logs', lazy=True))
     user = db.relationship('User', backref=db.backref('addon_logs', lazy=True))
+    
+    __table_args__ = (
+        db.Index('ix_add_on_log_request_timestamp', 'request_id', 'timestamp'),
+        db.Index('ix_add_on_log_timestamp', 'timestamp'),
+    )
+
+# Cold tier: completed/rejected requests older than ADDON_ARCHIVE_AFTER_DAYS
+# and their audit log, moved here in batches by archive_addon_requests().
+# Same columns and ids as the hot tables, without foreign keys.
+def _archive_table(model, *indexes):
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+               for column in model.__table__.columns]
+    return db.Table(f'{model.__tablename__}_archive', *columns, *indexes)
+
+addon_request_archive = _archive_table(
+    AddOnRequest,
+    db.Index('ix_add_on_request_archive_created', 'created_at'),
+    db.Index('ix_add_on_request_archive_status_created', 'status', 'created_at'),
+    db.Index('ix_add_on_request_archive_category_created', 'reason_category', 'created_at'),
+)
+addon_log_archive = _archive_table(
+    AddOnLog,
+    db.Index('ix_add_on_log_archive_request', 'request_id', 'timestamp'),
+    db.Index('ix_add_on_log_archive_timestamp', 'timestamp'),
+)
+
+# AddOnRequest over both tiers (UNION ALL); for analytics and include_archived
+AddOnRequestAll = aliased(AddOnRequest, db.select(AddOnRequest.__table__).union_all(
+    db.select(addon_request_archive)).subquery('add_on_request_all'))
+# Each archive table on its own, for queries that read the tiers separately
+AddOnRequestArchived = aliased(AddOnRequest, addon_request_archive, adapt_on_names=True)
+AddOnLogArchived = aliased(AddOnLog, addon_log_archive, adapt_on_names=True)
+
+# One row per committed archive batch; its max id versions the hot listings
+class AddOnArchiveBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    cutoff = db.Column(db.DateTime, nullable=False)
+    requests_moved = db.Column(db.Integer, nullable=False)
+    logs_moved = db.Column(db.Integer, nullable=False)
+
+# One row per completed shift handover; the unique key makes the job
+# run at most once per shift even if several workers fire it.
+class ShiftHandover(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    shift_date = db.Column(db.Date, nullable=False)  # date the ending shift started
+    shift_type = db.Column(db.String(20), nullable=False)  # ending shift: day, night
+    performed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rooms_archived = db.Column(db.Integer, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('shift_date', 'shift_type', name='uq_shift_handover_shift'),)
+
+class RoomShiftHistory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    handover_id = db.Column(db.Integer, db.ForeignKey('shift_handover.id'), nullable=False)
+    room_id = db.Column(db.Integer, nullable=False)
+    ward_id = db.Column(db.Integer, nullable=False)
+    shift_date = db.Column(db.Date, nullable=False)
+    shift_type = db.Column(db.String(20), nullable=False)
+    room_number = db.Column(db.String(20), nullable=False)
+    patient_name = db.Column(db.String(100))
+    patient_id = db.Column(db.String(50))
+    primary_nurse_name = db.Column(db.String(100))
+    primary_nurse_extension = db.Column(db.String(20))
+    backup_nurse_name = db.Column(db.String(100))
+    backup_nurse_extension = db.Column(db.String(20))
+    charge_nurse_name = db.Column(db.String(100))
+    notes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+    updated_by = db.Column(db.Integer)
+    
+    __table_args__ = (db.Index('ix_room_shift_history_ward_date', 'ward_id', 'shift_date', 'shift_type'),
+                      db.Index('ix_room_shift_history_date', 'shift_date', 'shift_type'))
+
+# Notifications waiting for delivery; written in the same transaction as
+# the AddOnLog entry they announce and drained by NotificationDispatcher.
+class NotificationOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)  # role:<role> or user:<id>
+    message = db.Column(db.Text, nullable=False)
+    dedupe_key = db.Column(db.String(200), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+                      db.Index('ix_notification_outbox_claim', 'claim_token'))
+
+# Add-on request counts pre-aggregated by creation time bucket. Kept in
+# step with add_on_request by bump_rollups(); `flask rebuild-rollups`
+# recomputes them from scratch. Requesters are not a dimension: one row
+# per user per bucket would leave next to nothing to aggregate.
+ROLLUP_DIMENSIONS = ('ward_id', 'requested_test', 'status', 'shift', 'preventable')
+
+class AddOnRollupColumns:
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.DateTime, nullable=False)  # start of the hour/day
+    ward_id = db.Column(db.Integer, nullable=False)
+    requested_test = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    shift = db.Column(db.String(20), nullable=False)  # day, night
+    preventable = db.Column(db.Boolean, nullable=False)
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+
+class AddOnRollupHourly(AddOnRollupColumns, db.Model):
+    __table_args__ = (db.UniqueConstraint('bucket', *ROLLUP_DIMENSIONS, name='uq_addon_rollup_hourly_key'),)
+
+class AddOnRollupDaily(AddOnRollupColumns, db.Model):
+    __table_args__ = (db.UniqueConstraint('bucket', *ROLLUP_DIMENSIONS, name='uq_addon_rollup_daily_key'),)
+
+# List serializers
+WARD_LIST = ListSerializer(Ward, [
+    ('id', Ward.id),
+    ('name', Ward.name),
+])
+
+ROOM_LIST = ListSerializer(Room, [
+    ('id', Room.id),
+    ('ward_id', Room.ward_id),
+    ('ward_name', Ward.name),
+    ('room_number', Room.room_number),
+    ('patient_name', Room.patient_name),
+    ('patient_id', Room.patient_id),
+    ('primary_nurse_name', Room.primary_nurse_name),
+    ('primary_nurse_extension', Room.primary_nurse_extension),
+    ('backup_nurse_name', Room.backup_nurse_name),
+    ('backup_nurse_extension', Room.backup_nurse_extension),
+    ('charge_nurse_name', Room.charge_nurse_name),
+    ('notes', Room.notes),
+    ('shift_type', Room.shift_type),
+    ('updated_at', Room.updated_at, isoformat),
+], joins=[Join(Ward, Room.ward_id == Ward.id)])
+
+# Critical call rows; ward_id rides along for the search index and is
+# popped before the row is stored.
+ROOM_SEARCH = ListSerializer(Room, [
+    ('id', Room.id),
+    ('ward_id', Room.ward_id),
+    ('ward_name', Ward.name),
+    ('room_number', Room.room_number),
+    ('patient_name', Room.patient_name),
+    ('patient_id', Room.patient_id),
+    ('primary_nurse_name', Room.primary_nurse_name),
+    ('primary_nurse_extension', Room.primary_nurse_extension),
+    ('backup_nurse_name', Room.backup_nurse_name),
+    ('backup_nurse_extension', Room.backup_nurse_extension),
+    ('charge_nurse_name', Room.charge_nurse_name),
+    ('updated_at', Room.updated_at, isoformat),
+], joins=[Join(Ward, Room.ward_id == Ward.id)])
+
+Requester = aliased(User)
+Reviewer = aliased(User)
+
+def _addon_request_list(source, extra=()):
+    return ListSerializer(source, [
+
+        ('id', source.id),
+        ('ward_id', source.ward_id),
+        ('ward_name', Ward.name),
+        ('room_id', source.room_id),
+        ('room_number', source.room_number),
+        ('patient_id', source.patient_id),
+        ('requested_test', source.requested_test),
+        ('reason', source.reason),
+        ('is_urgent', source.is_urgent),
+        ('has_previous_sample', source.has_previous_sample),
+        ('previous_sample_id', source.previous_sample_id),
+        ('additional_comment', source.additional_comment),
+        ('status', source.status),
+        ('rejection_reason', source.rejection_reason),
+        ('approval_action', source.approval_action),
+        ('requested_by', source.requested_by),
+        ('requester_name', Requester.name),
+        ('reviewed_by', source.reviewed_by),
+        ('reviewer_name', Reviewer.name),
+        ('created_at', source.created_at, isoformat),
+        ('reviewed_at', source.reviewed_at, isoformat),
+        ('completed_at', source.completed_at, isoformat),
+        *[(key, getattr(source, key)) for key in extra],
+    ], joins=[
+        Join(Ward, source.ward_id == Ward.id),
+        Join(Requester, source.requested_by == Requester.id),
+        Join(Reviewer, source.reviewed_by == Reviewer.id, outer=True),
+    ])
+
+ADDON_REQUEST_LIST = _addon_request_list(AddOnRequest)
+# Same rows from both tiers, for include_archived listings
+ADDON_REQUEST_ALL_LIST = _addon_request_list(AddOnRequestAll)
 
 # Root route
-@app.route('/')
+@bp.route('/')
 def root():
     return jsonify({
         'message': 'Ward & Lab Management System API',
@@ -102,12 +437,51 @@ def root():
             'rooms': '/api/rooms',
             'addon_requests': '/api/addon-requests',
             'critical_call': '/api/critical-call/search',
-            'analytics': '/api/analytics/addon-stats'
+            'analytics': '/api/analytics/addon-stats',
+            'dashboard': '/api/dashboard/summary'
         }
     }), 200
 
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
 # Auth Routes
-@app.route('/api/auth/register', methods=['POST'])
+def _user_payload(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'name': user.name
+    }
+
+def _load_identity(user_id):
+    user = db.session.get(User, user_id)
+    return _user_payload(user) if user else None
+
+def _issue_token(user):
+    # Role and name travel in the token so clients and endpoints can use
+    # them without a user lookup
+    return create_access_token(identity=user.id, additional_claims={'role': user.role, 'name': user.name})
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_identity(mapper, connection, user):
+    identity_cache.invalidate(user.id)
+
+@bp.app_errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    response = jsonify({'error': 'Too many sign-ins in progress, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@bp.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.json
     if User.query.filter_by(username=data['username']).first():
@@ -116,277 +490,693 @@ def register():
     user = User(
         username=data['username'],
         email=data['email'],
-        password_hash=generate_password_hash(data['password']),
+        password_hash=password_pool.generate(data['password']),
         role=data['role'],
         name=data['name']
     )
     db.session.add(user)
     db.session.commit()
     
-    access_token = create_access_token(identity=user.id)
+    payload = _user_payload(user)
+    identity_cache.put(user.id, payload)
     return jsonify({
-        'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'name': user.name
-        }
+        'access_token': _issue_token(user),
+        'user': payload
     }), 201
 
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json
     user = User.query.filter_by(username=data['username']).first()
     
-    if user and check_password_hash(user.password_hash, data['password']):
-        access_token = create_access_token(identity=user.id)
+    if user and password_pool.check(user.password_hash, data['password']):
+        payload = _user_payload(user)
+        identity_cache.put(user.id, payload)
         return jsonify({
-            'access_token': access_token,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'name': user.name
-            }
+            'access_token': _issue_token(user),
+            'user': payload
         }), 200
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
-@app.route('/api/auth/me', methods=['GET'])
+@bp.route('/api/auth/me', methods=['GET'])
+@read_only
 @jwt_required()
 def get_current_user():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = identity_cache.get(get_jwt_identity(), _load_identity)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'role': user.role,
-        'name': user.name
-    }), 200
+    return jsonify(user), 200
 
 # Route to create admin user manually (for troubleshooting)
-@app.route('/api/auth/create-admin', methods=['POST'])
+@bp.route('/api/auth/create-admin', methods=['POST'])
 def create_admin_manual():
     try:
-        with app.app_context():
-            # Check if admin already exists
-            admin = User.query.filter_by(username='admin').first()
-            if admin:
-                return jsonify({
-                    'message': 'Admin user already exists',
-                    'username': 'admin',
-                    'password': 'admin123'
-                }), 200
-            
-            # Create admin user
-            admin = User(
-                username='admin',
-                email='admin@hospital.com',
-                password_hash=generate_password_hash('admin123'),
-                role='admin',
-                name='System Administrator'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            
+        # Check if admin already exists
+        admin = User.query.filter_by(username='admin').first()
+        if admin:
             return jsonify({
-                'message': 'Admin user created successfully',
+                'message': 'Admin user already exists',
                 'username': 'admin',
                 'password': 'admin123'
-            }), 201
+            }), 200
+        
+        # Create admin user
+        admin = User(
+            username='admin',
+            email='admin@hospital.com',
+            password_hash=password_pool.generate('admin123'),
+            role='admin',
+            name='System Administrator'
+        )
+        db.session.add(admin)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Admin user created successfully',
+            'username': 'admin',
+            'password': 'admin123'
+        }), 201
+    except PasswordPoolBusy:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Ward Directory Routes
-@app.route('/api/wards', methods=['GET'])
+def directory_version():
+    """``(version, updated_at)`` of the ward/room directory."""
+    row = db.session.query(DirectoryVersion.version, DirectoryVersion.updated_at).filter(
+        DirectoryVersion.id == 1).first()
+    return tuple(row) if row else (0, None)
+
+def bump_directory_version(now=None):
+    """Invalidate cached directory responses once the current transaction commits."""
+    now = now or datetime.utcnow()
+    bumped = db.session.query(DirectoryVersion).filter(DirectoryVersion.id == 1).update(
+        {'version': DirectoryVersion.version + 1, 'updated_at': now}, synchronize_session=False)
+    if not bumped:
+        db.session.add(DirectoryVersion(id=1, version=1, updated_at=now))
+
+def directory_cache_get(key, load):
+    """This worker's LRU, then the host-wide cache file, then ``load``."""
+    return directory_cache.get(key, lambda k: directory_shared_cache.get(repr(k), lambda _: load(k)))
+
+@bp.route('/api/wards', methods=['GET'])
+@read_only
 @jwt_required()
 def get_wards():
-    wards = Ward.query.all()
-    return jsonify([{'id': w.id, 'name': w.name} for w in wards]), 200
+    version = directory_version()
+    etag = make_etag('wards', *version)
+    if not_modified(etag, version[1]):
+        return set_validators(current_app.response_class(status=304), etag, version[1])
+    response = cached_json_list_response(directory_cache_get, ('wards',) + version,
+                                         lambda: WARD_LIST.query(db.session), WARD_LIST.dump)
+    return set_validators(response, etag, version[1]), 200
 
-@app.route('/api/wards', methods=['POST'])
+@bp.route('/api/wards', methods=['POST'])
 @jwt_required()
 def create_ward():
     data = request.json
     ward = Ward(name=data['name'])
     db.session.add(ward)
+    bump_directory_version()
     db.session.commit()
     return jsonify({'id': ward.id, 'name': ward.name}), 201
 
-@app.route('/api/rooms', methods=['GET'])
+@bp.route('/api/rooms', methods=['GET'])
+@read_only
 @jwt_required()
 def get_rooms():
     ward_id = request.args.get('ward_id')
-    query = Room.query
+    try:
+        limit, cursor = page_args()
+        after_id = decode_cursor(cursor, int)[0] if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    version = directory_version()
+    last_modified = version[1]
+    etag = make_etag('rooms', ward_id, limit, cursor, *version)
+    if not_modified(etag, last_modified):
+        return set_validators(current_app.response_class(status=304), etag, last_modified)
+    
+    query = ROOM_LIST.query(db.session)
     if ward_id:
-        query = query.filter_by(ward_id=ward_id)
-    
-    rooms = query.all()
-    return jsonify([{
-        'id': r.id,
-        'ward_id': r.ward_id,
-        'ward_name': r.ward.name,
-        'room_number': r.room_number,
-        'patient_name': r.patient_name,
-        'patient_id': r.patient_id,
-        'primary_nurse_name': r.primary_nurse_name,
-        'primary_nurse_extension': r.primary_nurse_extension,
-        'backup_nurse_name': r.backup_nurse_name,
-        'backup_nurse_extension': r.backup_nurse_extension,
-        'charge_nurse_name': r.charge_nurse_name,
-        'notes': r.notes,
-        'shift_type': r.shift_type,
-        'updated_at': r.updated_at.isoformat() if r.updated_at else None
-    } for r in rooms]), 200
-
-@app.route('/api/rooms/bulk', methods=['POST'])
+        query = query.filter(Room.ward_id == ward_id)
+    if after_id is not None:
+        query = query.filter(Room.id > after_id)
+    query = query.order_by(Room.id)
+    
+    next_cursor = None
+    if limit:
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+        response = json_list_response(rows, ROOM_LIST.dump)
+    else:
+        # Full lists (what the ward screens load) are built once per version
+        response = cached_json_list_response(directory_cache_get, ('rooms', ward_id, cursor) + version,
+                                             lambda: query.yield_per(500), ROOM_LIST.dump)
+    return set_validators(response, etag, last_modified, next_cursor), 200
+
+ROOM_FIELDS = ('ward_id', 'room_number', 'patient_name', 'patient_id', 'primary_nurse_name',
+               'primary_nurse_extension', 'backup_nurse_name', 'backup_nurse_extension',
+               'charge_nurse_name', 'notes', 'shift_type')
+ROOM_REQUIRED_FIELDS = ('ward_id', 'room_number', 'primary_nurse_name', 'primary_nurse_extension')
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _normalize_room(room_data):
+    """Return ``(values, error)`` for one incoming room row."""
+    if not isinstance(room_data, dict):
+        return None, 'Room must be an object'
+    room_id = room_data.get('id')
+    if room_id is not None and type(room_id) is not int:
+        return None, 'Invalid id'
+    missing = [field for field in ROOM_REQUIRED_FIELDS if room_data.get(field) is None]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+    values = {}
+    for field in ROOM_FIELDS:
+        value = room_data.get(field)
+        if field == 'ward_id':
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None, 'Invalid ward_id'
+        elif value is not None and not isinstance(value, str):
+            value = str(value)
+        values[field] = value
+    if values['shift_type'] is None:
+        values['shift_type'] = 'day'
+    return values, None
+
+@bp.route('/api/rooms/bulk', methods=['POST'])
 @jwt_required()
 def bulk_update_rooms():
     user_id = get_jwt_identity()
     data = request.json
-    rooms_data = data['rooms']
-    
-    for room_data in rooms_data:
-        if room_data.get('id'):
-            room = Room.query.get(room_data['id'])
-            if room:
-                room.ward_id = room_data['ward_id']
-                room.room_number = room_data['room_number']
-                room.patient_name = room_data.get('patient_name')
-                room.patient_id = room_data.get('patient_id')
-                room.primary_nurse_name = room_data['primary_nurse_name']
-                room.primary_nurse_extension = room_data['primary_nurse_extension']
-                room.backup_nurse_name = room_data.get('backup_nurse_name')
-                room.backup_nurse_extension = room_data.get('backup_nurse_extension')
-                room.charge_nurse_name = room_data.get('charge_nurse_name')
-                room.notes = room_data.get('notes')
-                room.shift_type = room_data.get('shift_type', 'day')
-                room.updated_by = user_id
-                room.updated_at = datetime.utcnow()
+    rooms_data = data.get('rooms') if isinstance(data, dict) else None
+    if not isinstance(rooms_data, list):
+        return jsonify({'error': 'rooms must be a list'}), 400
+    
+    # Validate the whole payload before writing anything
+    results, rows = [], []
+    for index, room_data in enumerate(rooms_data):
+        values, error = _normalize_room(room_data)
+        room_id = room_data.get('id') if isinstance(room_data, dict) else None
+        results.append({'index': index, 'id': room_id or None, 'status': 'error' if error else None})
+        if error:
+            results[-1]['error'] = error
         else:
-            room = Room(
-                ward_id=room_data['ward_id'],
-                room_number=room_data['room_number'],
-                patient_name=room_data.get('patient_name'),
-                patient_id=room_data.get('patient_id'),
-                primary_nurse_name=room_data['primary_nurse_name'],
-                primary_nurse_extension=room_data['primary_nurse_extension'],
-                backup_nurse_name=room_data.get('backup_nurse_name'),
-                backup_nurse_extension=room_data.get('backup_nurse_extension'),
-                charge_nurse_name=room_data.get('charge_nurse_name'),
-                notes=room_data.get('notes'),
-                shift_type=room_data.get('shift_type', 'day'),
-                updated_by=user_id
-            )
-            db.session.add(room)
+            rows.append((index, room_id or None, values))
+    
+    ward_ids = {values['ward_id'] for _, _, values in rows}
+    known_wards = set()
+    for chunk in _chunks(ward_ids):
+        known_wards.update(w for w, in db.session.query(Ward.id).filter(Ward.id.in_(chunk)))
+    
+    stored = {}
+    columns = [Room.id] + [getattr(Room, field) for field in ROOM_FIELDS]
+    for chunk in _chunks({room_id for _, room_id, _ in rows if room_id}):
+        for row in db.session.query(*columns).filter(Room.id.in_(chunk)):
+            stored[row.id] = dict(zip(ROOM_FIELDS, row[1:]))
     
+    new_rooms = set()
+    for index, room_id, values in rows:
+        if values['ward_id'] not in known_wards:
+            results[index].update(status='error', error='Ward not found')
+        elif room_id and room_id not in stored:
+            results[index].update(status='error', error='Room not found')
+        elif not room_id:
+            key = (values['ward_id'], values['room_number'])
+            if key in new_rooms:
+                results[index].update(status='error', error='Duplicate room number in payload')
+            new_rooms.add(key)
+    
+    if any(result['status'] == 'error' for result in results):
+        return jsonify({'error': 'Invalid rooms payload', 'results': results}), 400
+    
+    # Write only rows that actually changed
+    now = datetime.utcnow()
+    updates, inserts = [], []
+    for index, room_id, values in rows:
+        if room_id:
+            changed = {field: value for field, value in values.items() if stored[room_id][field] != value}
+            if changed:
+                updates.append(dict(changed, id=room_id, updated_by=user_id, updated_at=now))
+                results[index]['status'] = 'updated'
+            else:
+                results[index]['status'] = 'unchanged'
+        else:
+            inserts.append((index, dict(values, updated_by=user_id, updated_at=now)))
+    
+    if updates:
+        db.session.bulk_update_mappings(Room, updates)
+    if inserts:
+        # RETURNING order is not guaranteed (asking for it makes SQLite fall
+        # back to one INSERT per row), so match new ids on (ward, room number)
+        new_ids = {
+            (ward_id, room_number): room_id
+            for room_id, ward_id, room_number in db.session.execute(
+                insert(Room).returning(Room.id, Room.ward_id, Room.room_number),
+                [mapping for _, mapping in inserts])
+        }
+        for index, mapping in inserts:
+            results[index].update(id=new_ids[(mapping['ward_id'], mapping['room_number'])], status='created')
+    
+    touched = [update['id'] for update in updates] + [
+        results[index]['id'] for index, _ in inserts]
+    index_entries = []
+    for chunk in _chunks(touched):
+        index_entries.extend(_search_index_entries(
+            ROOM_SEARCH.query(db.session).filter(Room.id.in_(chunk))))
+    if touched:
+        bump_directory_version(now)
     db.session.commit()
-    return jsonify({'message': 'Rooms updated successfully'}), 200
+    room_search_index.upsert_many(index_entries)
+    
+    counts = {status: sum(1 for r in results if r['status'] == status)
+              for status in ('created', 'updated', 'unchanged')}
+    return jsonify({'message': 'Rooms updated successfully', 'results': results, **counts}), 200
+
+# Shift handover
+SHIFT_HISTORY_LIST = ListSerializer(RoomShiftHistory, [
+    ('id', RoomShiftHistory.id),
+    ('room_id', RoomShiftHistory.room_id),
+    ('ward_id', RoomShiftHistory.ward_id),
+    ('ward_name', Ward.name),
+    ('shift_date', RoomShiftHistory.shift_date, isoformat),
+    ('shift_type', RoomShiftHistory.shift_type),
+    ('room_number', RoomShiftHistory.room_number),
+    ('patient_name', RoomShiftHistory.patient_name),
+    ('patient_id', RoomShiftHistory.patient_id),
+    ('primary_nurse_name', RoomShiftHistory.primary_nurse_name),
+    ('primary_nurse_extension', RoomShiftHistory.primary_nurse_extension),
+    ('backup_nurse_name', RoomShiftHistory.backup_nurse_name),
+    ('backup_nurse_extension', RoomShiftHistory.backup_nurse_extension),
+    ('charge_nurse_name', RoomShiftHistory.charge_nurse_name),
+    ('notes', RoomShiftHistory.notes),
+    ('updated_at', RoomShiftHistory.updated_at, isoformat),
+], joins=[Join(Ward, RoomShiftHistory.ward_id == Ward.id)])
+
+SHIFT_START_HOURS = {'day': 7, 'night': 19}
+
+def _shift_timezone(config):
+    return ZoneInfo(config['SHIFT_TIMEZONE'])
+
+def _shift_start(shift_date, shift_type, tz):
+    """UTC time (naive, like stored timestamps) at which the shift starts in ``tz``."""
+    start = datetime.combine(shift_date, datetime.min.time(), tzinfo=tz).replace(hour=SHIFT_START_HOURS[shift_type])
+    return start.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _current_shift(now, tz):
+    """Return (shift_date, shift_type) of the shift running at UTC ``now`` in ``tz``."""
+    local = now.replace(tzinfo=timezone.utc).astimezone(tz)
+    if local.hour >= SHIFT_START_HOURS['night']:
+        return local.date(), 'night'
+    if local.hour >= SHIFT_START_HOURS['day']:
+        return local.date(), 'day'
+    return local.date() - timedelta(days=1), 'night'
+
+def _in_handover_window(now, tz, grace):
+    """Whether ``now`` is at most ``grace`` past the start of the running shift."""
+    return now - _shift_start(*_current_shift(now, tz), tz) <= grace
+
+def _previous_shift(shift_date, shift_type):
+    if shift_type == 'day':
+        return shift_date - timedelta(days=1), 'night'
+    return shift_date, 'day'
+
+def run_shift_handover(now=None, force=False):
+    """Snapshot every room into room_shift_history and clear the nurse fields.
+
+    Archives the shift that ended at the most recent 7 AM / 7 PM boundary
+    in SHIFT_TIMEZONE.
+    Everything happens in one transaction with set-based statements;
+    returns the ShiftHandover id, or None if that shift was already handed
+    over (e.g. by another worker) or if ``now`` is more than
+    SHIFT_HANDOVER_GRACE_MINUTES past the boundary and not ``force``: the
+    rooms then hold the running shift's assignments, not the ended one's.
+    """
+    now = now or datetime.utcnow()
+    tz = _shift_timezone(current_app.config)
+    if not force and not _in_handover_window(now, tz, _handover_grace(current_app.config)):
+        return None
+    new_date, new_shift = _current_shift(now, tz)
+    shift_date, shift_type = _previous_shift(new_date, new_shift)
+    
+    handover = ShiftHandover(shift_date=shift_date, shift_type=shift_type, performed_at=now)
+    db.session.add(handover)
+    try:
+        # Claims the shift; a concurrent run fails here on the unique key
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    
+    snapshot_columns = ['room_number', 'patient_name', 'patient_id', 'primary_nurse_name',
+                        'primary_nurse_extension', 'backup_nurse_name', 'backup_nurse_extension',
+                        'charge_nurse_name', 'notes', 'updated_at', 'updated_by']
+    snapshot = db.session.execute(
+        insert(RoomShiftHistory).from_select(
+            ['handover_id', 'room_id', 'ward_id', 'shift_date', 'shift_type'] + snapshot_columns,
+            db.select(
+                literal(handover.id), Room.id, Room.ward_id, literal(shift_date, db.Date),
+                literal(shift_type), *[getattr(Room, column) for column in snapshot_columns]
+            )
+        )
+    )
+    db.session.execute(
+        db.update(Room).values(
+            primary_nurse_name='',
+            primary_nurse_extension='',
+            backup_nurse_name=None,
+            backup_nurse_extension=None,
+            charge_nurse_name=None,
+            shift_type=new_shift,
+            updated_by=None,
+            updated_at=now
+        ).execution_options(synchronize_session=False)
+    )
+    handover.rooms_archived = snapshot.rowcount
+    bump_directory_version(now)
+    db.session.commit()
+    return handover.id
+
+def _next_shift_boundary(now, tz):
+    shift_date = _current_shift(now, tz)[0]
+    for day in (shift_date, shift_date + timedelta(days=1), shift_date + timedelta(days=2)):
+        for shift_type in sorted(SHIFT_START_HOURS, key=SHIFT_START_HOURS.get):
+            boundary = _shift_start(day, shift_type, tz)
+            if boundary > now:
+                return boundary
+
+def _handover_grace(config):
+    return timedelta(minutes=config['SHIFT_HANDOVER_GRACE_MINUTES'])
+
+# Seconds between attempts after a failed handover, while its window is open
+SHIFT_HANDOVER_RETRY_SECONDS = 60
+
+def _shift_handover_loop(app):
+    grace = _handover_grace(app.config)
+    tz = _shift_timezone(app.config)
+    while True:
+        now = datetime.utcnow()
+        if _in_handover_window(now, tz, grace):
+            try:
+                with app.app_context():
+                    if run_shift_handover(now):
+                        refresh_search_index(force=True)
+            except Exception:
+                app.logger.exception('Shift handover failed; retrying in %d s', SHIFT_HANDOVER_RETRY_SECONDS)
+                time.sleep(SHIFT_HANDOVER_RETRY_SECONDS)
+                continue
+        time.sleep(max(1, (_next_shift_boundary(datetime.utcnow(), tz) - datetime.utcnow()).total_seconds() + 1))
+
+_shift_scheduler = None
+_shift_scheduler_lock = threading.Lock()
+
+def start_shift_scheduler(app):
+    global _shift_scheduler
+    with _shift_scheduler_lock:
+        if _shift_scheduler is None:
+            _shift_scheduler = threading.Thread(target=_shift_handover_loop, args=(app,),
+                                                name='shift-handover', daemon=True)
+            _shift_scheduler.start()
+
+@bp.cli.command('shift-handover')
+@click.option('--force', is_flag=True, help='Hand over even when the last boundary is past the grace window.')
+def shift_handover_command(force):
+    """Hand over the shift that ended at the last 7 AM / 7 PM boundary."""
+    now = datetime.utcnow()
+    grace = _handover_grace(current_app.config)
+    if not force and not _in_handover_window(now, _shift_timezone(current_app.config), grace):
+        print(f"More than {int(grace.total_seconds() // 60)} minutes past the last shift boundary; "
+              "the rooms belong to the running shift. Use --force to hand over anyway.")
+        raise SystemExit(1)
+    handover_id = run_shift_handover(now, force=force)
+    if handover_id:
+        handover = db.session.get(ShiftHandover, handover_id)
+        print(f"Archived {handover.rooms_archived} rooms for the {handover.shift_type} shift of {handover.shift_date}")
+    else:
+        print("Shift already handed over")
+
+@bp.route('/api/rooms/history', methods=['GET'])
+@read_only
+@jwt_required()
+def get_room_history():
+    try:
+        shift_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'date is required (YYYY-MM-DD)'}), 400
+    ward_id = request.args.get('ward_id')
+    shift_type = request.args.get('shift_type')
+    
+    query = SHIFT_HISTORY_LIST.query(db.session).filter(RoomShiftHistory.shift_date == shift_date)
+    if ward_id:
+        query = query.filter(RoomShiftHistory.ward_id == ward_id)
+    if shift_type:
+        query = query.filter(RoomShiftHistory.shift_type == shift_type)
+    query = query.order_by(RoomShiftHistory.ward_id, RoomShiftHistory.shift_type, RoomShiftHistory.room_id)
+    return jsonify(SHIFT_HISTORY_LIST.dump_all(query)), 200
 
 # Critical Call Helper Routes
-@app.route('/api/critical-call/search', methods=['GET'])
+def _search_index_entries(query):
+    for row in query:
+        data = ROOM_SEARCH.dump(row)
+        yield data, data.pop('ward_id')
+
+def refresh_search_index(force=False):
+    """Reload every room when the directory version has moved.
+
+    A full reload rather than rooms changed since some timestamp:
+    updated_at comes from each writer's clock before it takes the write
+    lock, so commits do not land in updated_at order. Directory changes
+    are rare, and the version is read first, so a change committed while
+    the rooms load triggers another reload next time.
+    """
+    if not force and not room_search_index.needs_refresh(current_app.config['SEARCH_INDEX_REFRESH_SECONDS']):
+        return
+    version = directory_version()
+    if not force and room_search_index.loaded and room_search_index.version == version:
+        return
+    room_search_index.reload(_search_index_entries(ROOM_SEARCH.query(db.session)))
+    room_search_index.version = version
+
+@bp.route('/api/critical-call/search', methods=['GET'])
+@read_only
 @jwt_required()
 def search_critical_call():
     query = request.args.get('q', '')
     ward_id = request.args.get('ward_id')
     search_type = request.args.get('type', 'all')  # ward, room, patient, nurse
     
-    rooms_query = Room.query
-    
     if ward_id:
-        rooms_query = rooms_query.filter_by(ward_id=ward_id)
-    
-    if search_type == 'ward':
-        rooms_query = rooms_query.join(Ward).filter(Ward.name.ilike(f'%{query}%'))
-    elif search_type == 'room':
-        rooms_query = rooms_query.filter(Room.room_number.ilike(f'%{query}%'))
-    elif search_type == 'patient':
-        rooms_query = rooms_query.filter(
-            (Room.patient_id.ilike(f'%{query}%')) | 
-            (Room.patient_name.ilike(f'%{query}%'))
-        )
-    elif search_type == 'nurse':
-        rooms_query = rooms_query.filter(
-            (Room.primary_nurse_name.ilike(f'%{query}%')) |
-            (Room.backup_nurse_name.ilike(f'%{query}%'))
-        )
+        try:
+            ward_id = int(ward_id)
+        except ValueError:
+            return jsonify([]), 200
     else:
-        rooms_query = rooms_query.filter(
-            (Room.room_number.ilike(f'%{query}%')) |
-            (Room.patient_id.ilike(f'%{query}%')) |
-            (Room.patient_name.ilike(f'%{query}%')) |
-            (Room.primary_nurse_name.ilike(f'%{query}%')) |
-            (Room.backup_nurse_name.ilike(f'%{query}%'))
-        )
+        ward_id = None
     
-    rooms = rooms_query.limit(50).all()
-    return jsonify([{
-        'id': r.id,
-        'ward_name': r.ward.name,
-        'room_number': r.room_number,
-        'patient_name': r.patient_name,
-        'patient_id': r.patient_id,
-        'primary_nurse_name': r.primary_nurse_name,
-        'primary_nurse_extension': r.primary_nurse_extension,
-        'backup_nurse_name': r.backup_nurse_name,
-        'backup_nurse_extension': r.backup_nurse_extension,
-        'charge_nurse_name': r.charge_nurse_name,
-        'updated_at': r.updated_at.isoformat() if r.updated_at else None
-    } for r in rooms]), 200
+    refresh_search_index()
+    rooms = room_search_index.search(query, search_type, ward_id=ward_id, limit=50)
+    return json_list_response(rooms), 200
+
+group_committer = GroupCommitter(db)
+
+# Notifications
+notification_dispatcher = NotificationDispatcher(db, NotificationOutbox)
+
+# Background threads start with a worker's first request rather than in
+# create_app(), so they run in every worker even when the app is built in
+# the gunicorn master (--preload) and forked.
+@bp.before_app_request
+def _start_background_threads():
+    if current_app.config['NOTIFICATION_WORKERS'] > 0:
+        notification_dispatcher.start()
+    if current_app.config['SHIFT_HANDOVER_SCHEDULER'] and _shift_scheduler is None:
+        start_shift_scheduler(current_app._get_current_object())
+
+def enqueue_notification(recipient, message, dedupe_key, batch=None):
+    """Queue a notification in the current transaction (once per dedupe_key).
+
+    With a ``batch`` the row is added to ``batch.notifications`` and checked
+    against the dedupe keys the batch already knows, saving the lookup.
+    """
+    values = {'recipient': recipient, 'message': message, 'dedupe_key': dedupe_key}
+    if batch is not None:
+        if dedupe_key not in batch.dedupe_keys:
+            batch.dedupe_keys.add(dedupe_key)
+            batch.notifications.append(values)
+    elif not db.session.query(NotificationOutbox.id).filter_by(dedupe_key=dedupe_key).first():
+        db.session.add(NotificationOutbox(**values))
+
+def _describe_request(request_obj):
+    return f"#{request_obj.id} ({request_obj.requested_test}, room {request_obj.room_number})"
+
+@bp.cli.command('notifications-worker')
+def notifications_worker_command():
+    """Deliver queued notifications in the foreground."""
+    notification_dispatcher.run_forever()
 
 # Add-On Request Routes
-@app.route('/api/addon-requests', methods=['GET'])
+@bp.route('/api/addon-requests', methods=['GET'])
+@read_only
 @jwt_required()
 def get_addon_requests():
     status = request.args.get('status')
     ward_id = request.args.get('ward_id')
+    include_archived = request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+    source, serializer = ((AddOnRequestAll, ADDON_REQUEST_ALL_LIST) if include_archived
+                          else (AddOnRequest, ADDON_REQUEST_LIST))
+    try:
+        limit, cursor = page_args()
+        after = decode_cursor(cursor, datetime, int) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Every create/approve/reject/complete writes an AddOnLog row and every
+    # archive run an AddOnArchiveBatch row, so these ids change whenever
+    # any listing could.
+    newest_request_id, last_archive_batch = db.session.query(
+        func.max(AddOnRequest.id), db.select(func.max(AddOnArchiveBatch.id)).scalar_subquery()).one()
+    newest_log = db.session.query(AddOnLog.id, AddOnLog.timestamp).order_by(AddOnLog.id.desc()).first()
+    last_modified = newest_log.timestamp if newest_log else None
+    etag = make_etag('addon-requests', status, ward_id, limit, cursor, include_archived,
+                     newest_request_id, newest_log.id if newest_log else None, last_archive_batch)
+    if not_modified(etag, last_modified):
+        return set_validators(current_app.response_class(status=304), etag, last_modified)
     
-    query = AddOnRequest.query
+    query = serializer.query(db.session)
     
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(source.status == status)
     if ward_id:
-        query = query.filter_by(ward_id=ward_id)
-    
-    requests = query.order_by(AddOnRequest.created_at.desc()).all()
-    return jsonify([{
-        'id': r.id,
-        'ward_id': r.ward_id,
-        'ward_name': r.ward.name,
-        'room_id': r.room_id,
-        'room_number': r.room_number,
-        'patient_id': r.patient_id,
-        'requested_test': r.requested_test,
-        'reason': r.reason,
-        'is_urgent': r.is_urgent,
-        'has_previous_sample': r.has_previous_sample,
-        'previous_sample_id': r.previous_sample_id,
-        'additional_comment': r.additional_comment,
-        'status': r.status,
-        'rejection_reason': r.rejection_reason,
-        'approval_action': r.approval_action,
-        'requested_by': r.requested_by,
-        'requester_name': r.requester.name,
-        'reviewed_by': r.reviewed_by,
-        'reviewer_name': r.reviewer.name if r.reviewer else None,
-        'created_at': r.created_at.isoformat(),
-        'reviewed_at': r.reviewed_at.isoformat() if r.reviewed_at else None,
-        'completed_at': r.completed_at.isoformat() if r.completed_at else None
-    } for r in requests]), 200
-
-@app.route('/api/addon-requests', methods=['POST'])
+        query = query.filter(source.ward_id == ward_id)
+    if after:
+        created_at, request_id = after
+        query = query.filter(
+            (source.created_at < created_at) |
+            ((source.created_at == created_at) & (source.id < request_id))
+        )
+    
+    query = query.order_by(source.created_at.desc(), source.id.desc())
+    
+    next_cursor = None
+    if limit:
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    else:
+        rows = query.yield_per(500)
+    
+    response = json_list_response(rows, serializer.dump)
+    return set_validators(response, etag, last_modified, next_cursor), 200
+
+# Add-on change feed
+def _fetch_addon_events(after_id, limit):
+    rows = ADDON_REQUEST_LIST.query(db.session).join(
+        AddOnLog, AddOnLog.request_id == AddOnRequest.id
+    ).add_columns(
+        AddOnLog.id.label('event_id'),
+        AddOnLog.action.label('event_action'),
+        AddOnLog.performed_by.label('event_performed_by'),
+        AddOnLog.timestamp.label('event_timestamp'),
+    ).filter(AddOnLog.id > after_id).order_by(AddOnLog.id).limit(limit).all()
+    return [{
+        'id': r.event_id,
+        'action': r.event_action,
+        'performed_by': r.event_performed_by,
+        'timestamp': isoformat(r.event_timestamp),
+        'request': ADDON_REQUEST_LIST.dump(r)
+    } for r in rows]
+
+def _latest_addon_event_id():
+    return db.session.query(func.max(AddOnLog.id)).scalar()
+
+addon_change_feed = ChangeFeed(_fetch_addon_events, _latest_addon_event_id)
+
+def _event_filter():
+    ward_id = request.args.get('ward_id', type=int)
+    status = request.args.get('status')
+    def matches(change):
+        return ((ward_id is None or change['request']['ward_id'] == ward_id) and
+                (not status or change['request']['status'] == status))
+    return matches
+
+@bp.route('/api/addon-requests/changes', methods=['GET'])
 @jwt_required()
-def create_addon_request():
-    user_id = get_jwt_identity()
-    data = request.json
+def get_addon_changes():
+    """Long-poll for add-on events after ``since`` (defaults to now)."""
+    since = request.args.get('since', type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    matches = _event_filter()
+    events, cursor = addon_change_feed.read(since, timeout)
+    return jsonify({
+        'events': [change for change in events if matches(change)],
+        'cursor': cursor
+    }), 200
+
+@bp.route('/api/addon-requests/events', methods=['GET'])
+@jwt_required()
+def stream_addon_events():
+    """Server-sent events for add-on create/approve/reject/complete."""
+    since = request.args.get('since', type=int)
+    if since is None and request.headers.get('Last-Event-ID', '').isdigit():
+        since = int(request.headers['Last-Event-ID'])
+    matches = _event_filter()
+    dumps = current_app.json.dumps
+    
+    def stream(cursor):
+        yield 'retry: 3000\n\n'
+        while True:
+            events, cursor = addon_change_feed.read(cursor, 15)
+            for change in events:
+                if matches(change):
+                    yield f"id: {change['id']}\nevent: {change['action']}\ndata: {dumps(change)}\n\n"
+            if not events:
+                yield ': keep-alive\n\n'
     
+    return Response(stream(since), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Add-on write path. Each function applies one state change together with
+# its rollup, AddOnLog and outbox rows to db.session without committing and
+# returns (payload, status); run_addon_write() commits it as one transaction,
+# or hands it to the group committer when ADDON_GROUP_COMMIT is on.
+def run_addon_write(fn, *args):
+    if current_app.config['ADDON_GROUP_COMMIT']:
+        return group_committer.submit(fn, *args)
+    try:
+        result = fn(*args)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+def turnaround_seconds(created_at, at):
+    return int((at - created_at).total_seconds())
+
+def add_addon_log(request_id, action, user_id, notes, batch=None):
+    values = {'request_id': request_id, 'action': action, 'performed_by': user_id, 'notes': notes}
+    if batch is not None:
+        batch.logs.append(values)
+    else:
+        db.session.add(AddOnLog(**values))
+
+def create_addon_request_write(user_id, data):
+    reason_category, preventable = reason_classifier.classify(data['reason'])
     request_obj = AddOnRequest(
         ward_id=data['ward_id'],
         room_id=data.get('room_id'),
@@ -394,6 +1184,8 @@ def create_addon_request():
         patient_id=data['patient_id'],
         requested_test=data['requested_test'],
         reason=data['reason'],
+        reason_category=reason_category,
+        preventable=preventable,
         is_urgent=data.get('is_urgent', False),
         has_previous_sample=data.get('has_previous_sample', False),
         previous_sample_id=data.get('previous_sample_id'),
@@ -402,7 +1194,8 @@ def create_addon_request():
     )
     
     db.session.add(request_obj)
-    db.session.commit()
+    db.session.flush()
+    bump_rollups(request_obj, 1)
     
     # Create log entry
     log = AddOnLog(
@@ -412,209 +1205,997 @@ def create_addon_request():
         notes='Add-on request created'
     )
     db.session.add(log)
-    db.session.commit()
-    
-    # TODO: Send notification (email/SMS)
+    ward = db.session.get(Ward, request_obj.ward_id)
+    enqueue_notification(
+        'role:lab_staff',
+        f"{'URGENT ' if request_obj.is_urgent else ''}New add-on request {_describe_request(request_obj)}"
+        f" from {ward.name if ward else 'unknown ward'}",
+        f'addon:{request_obj.id}:created'
+    )
     
-    return jsonify({
+    return {
         'id': request_obj.id,
         'message': 'Add-on request created successfully'
-    }), 201
+    }, 201
 
-@app.route('/api/addon-requests/<int:request_id>/approve', methods=['POST'])
-@jwt_required()
-def approve_addon_request(request_id):
-    user_id = get_jwt_identity()
-    data = request.json
-    
-    request_obj = AddOnRequest.query.get(request_id)
+def approve_addon_request_write(request_id, user_id, data, batch=None):
+    request_obj = db.session.get(AddOnRequest, request_id)
     if not request_obj:
-        return jsonify({'error': 'Request not found'}), 404
+        return {'error': 'Request not found'}, 404
     
+    move_rollups(request_obj, 'approved', batch)
     request_obj.status = 'approved'
     request_obj.approval_action = data['action']  # add_to_same_sample or need_new_sample
     request_obj.reviewed_by = user_id
     request_obj.reviewed_at = datetime.utcnow()
+    request_obj.review_seconds = turnaround_seconds(request_obj.created_at, request_obj.reviewed_at)
     
-    # Create log entry
-    log = AddOnLog(
-        request_id=request_obj.id,
-        action='approved',
-        performed_by=user_id,
-        notes=f"Approved with action: {data['action']}"
+    add_addon_log(request_obj.id, 'approved', user_id, f"Approved with action: {data['action']}", batch)
+    enqueue_notification(
+        f'user:{request_obj.requested_by}',
+        f"Add-on request {_describe_request(request_obj)} approved: {data['action']}",
+        f'addon:{request_obj.id}:approved',
+        batch
     )
-    db.session.add(log)
-    db.session.commit()
     
-    # TODO: Send notification to requester
-    
-    return jsonify({'message': 'Request approved successfully'}), 200
+    return {'message': 'Request approved successfully'}, 200
 
-@app.route('/api/addon-requests/<int:request_id>/reject', methods=['POST'])
-@jwt_required()
-def reject_addon_request(request_id):
-    user_id = get_jwt_identity()
-    data = request.json
-    
-    request_obj = AddOnRequest.query.get(request_id)
+def reject_addon_request_write(request_id, user_id, data, batch=None):
+    request_obj = db.session.get(AddOnRequest, request_id)
     if not request_obj:
-        return jsonify({'error': 'Request not found'}), 404
+        return {'error': 'Request not found'}, 404
     
+    move_rollups(request_obj, 'rejected', batch)
     request_obj.status = 'rejected'
     request_obj.rejection_reason = data['reason']
     request_obj.reviewed_by = user_id
     request_obj.reviewed_at = datetime.utcnow()
+    request_obj.review_seconds = turnaround_seconds(request_obj.created_at, request_obj.reviewed_at)
     
-    # Create log entry
-    log = AddOnLog(
-        request_id=request_obj.id,
-        action='rejected',
-        performed_by=user_id,
-        notes=f"Rejected: {data['reason']}"
+    add_addon_log(request_obj.id, 'rejected', user_id, f"Rejected: {data['reason']}", batch)
+    enqueue_notification(
+        f'user:{request_obj.requested_by}',
+        f"Add-on request {_describe_request(request_obj)} rejected: {data['reason']}",
+        f'addon:{request_obj.id}:rejected',
+        batch
     )
-    db.session.add(log)
-    db.session.commit()
-    
-    # TODO: Send notification to requester
     
-    return jsonify({'message': 'Request rejected successfully'}), 200
+    return {'message': 'Request rejected successfully'}, 200
 
-@app.route('/api/addon-requests/<int:request_id>/complete', methods=['POST'])
-@jwt_required()
-def complete_addon_request(request_id):
-    user_id = get_jwt_identity()
-    
-    request_obj = AddOnRequest.query.get(request_id)
+def complete_addon_request_write(request_id, user_id, data=None, batch=None):
+    request_obj = db.session.get(AddOnRequest, request_id)
     if not request_obj:
-        return jsonify({'error': 'Request not found'}), 404
+        return {'error': 'Request not found'}, 404
     
+    move_rollups(request_obj, 'completed', batch)
     request_obj.status = 'completed'
     request_obj.completed_at = datetime.utcnow()
+    request_obj.complete_seconds = turnaround_seconds(request_obj.created_at, request_obj.completed_at)
     
-    # Create log entry
-    log = AddOnLog(
-        request_id=request_obj.id,
-        action='completed',
-        performed_by=user_id,
-        notes='Add-on test completed'
-    )
-    db.session.add(log)
-    db.session.commit()
+    add_addon_log(request_obj.id, 'completed', user_id, 'Add-on test completed', batch)
     
-    return jsonify({'message': 'Request marked as completed'}), 200
+    return {'message': 'Request marked as completed'}, 200
 
-# Analytics Routes
-@app.route('/api/analytics/addon-stats', methods=['GET'])
+@bp.route('/api/addon-requests', methods=['POST'])
 @jwt_required()
-def get_addon_stats():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+def create_addon_request():
+    payload, status = run_addon_write(create_addon_request_write, get_jwt_identity(), request.json)
+    return jsonify(payload), status
+
+@bp.route('/api/addon-requests/<int:request_id>/approve', methods=['POST'])
+@jwt_required()
+def approve_addon_request(request_id):
+    payload, status = run_addon_write(approve_addon_request_write, request_id, get_jwt_identity(), request.json)
+    return jsonify(payload), status
+
+@bp.route('/api/addon-requests/<int:request_id>/reject', methods=['POST'])
+@jwt_required()
+def reject_addon_request(request_id):
+    payload, status = run_addon_write(reject_addon_request_write, request_id, get_jwt_identity(), request.json)
+    return jsonify(payload), status
+
+@bp.route('/api/addon-requests/<int:request_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_addon_request(request_id):
+    payload, status = run_addon_write(complete_addon_request_write, request_id, get_jwt_identity())
+    return jsonify(payload), status
+
+# Batch lab actions. The targets are loaded in one query so the write
+# functions above find them in the session's identity map. Given a batch
+# they collect log and outbox rows and rollup changes instead of writing
+# them, and AddOnBatch.write() inserts them with one statement per table.
+class AddOnBatch:
+    def __init__(self, dedupe_keys=()):
+        self.rollup_deltas = Counter()
+        self.dedupe_keys = set(dedupe_keys)
+        self.logs = []
+        self.notifications = []
+
+    def write(self):
+        apply_rollup_deltas(self.rollup_deltas)
+        # The ORM inserts one row per statement when it has to fetch ids;
+        # bulk insert() does not fetch them
+        for model, rows in ((AddOnLog, self.logs), (NotificationOutbox, self.notifications)):
+            if rows:
+                db.session.execute(insert(model), rows)
+
+# action -> (write function, statuses it applies to, required payload field)
+ADDON_BATCH_ACTIONS = {
+    'approve': (approve_addon_request_write, ('pending',), 'action'),
+    'reject': (reject_addon_request_write, ('pending',), 'reason'),
+    'complete': (complete_addon_request_write, ('approved',), None),
+}
+APPROVAL_ACTIONS = ('add_to_same_sample', 'need_new_sample')
+
+def batch_addon_actions_write(user_id, operations):
+    targets = {r.id: r for r in AddOnRequest.query.filter(AddOnRequest.id.in_({op['id'] for op in operations}))}
+    dedupe_keys = [f'addon:{request_id}:{event}' for request_id in targets for event in ('approved', 'rejected')]
+    batch = AddOnBatch(key for key, in db.session.query(NotificationOutbox.dedupe_key).filter(
+        NotificationOutbox.dedupe_key.in_(dedupe_keys)))
+    results = []
+    for op in operations:
+        action, payload = op['action'], op.get('payload') or {}
+        write, from_statuses, field = ADDON_BATCH_ACTIONS[action]
+        request_obj = targets.get(op['id'])
+        # Checked in order, so a later operation sees the effect of an earlier one
+        if request_obj is None:
+            body, status = {'error': 'Request not found'}, 404
+        elif request_obj.status not in from_statuses:
+            body, status = {'error': f'Cannot {action} a request that is {request_obj.status}'}, 409
+        elif field and not payload.get(field):
+            body, status = {'error': f'payload.{field} is required'}, 400
+        elif action == 'approve' and payload['action'] not in APPROVAL_ACTIONS:
+            body, status = {'error': f"payload.action must be one of {', '.join(APPROVAL_ACTIONS)}"}, 400
+        else:
+            body, status = write(request_obj.id, user_id, payload, batch)
+        results.append(dict(body, id=op['id'], action=action, status=status))
+    batch.write()
+    applied = sum(1 for result in results if result['status'] == 200)
+    return {'applied': applied, 'failed': len(results) - applied, 'results': results}, 200
+
+@bp.route('/api/addon-requests/batch', methods=['POST'])
+@jwt_required()
+def batch_addon_actions():
+    """Apply many approve/reject/complete operations in one transaction."""
+    body = request.get_json(silent=True)
+    operations = body.get('operations') if isinstance(body, dict) else body
+    limit = current_app.config['ADDON_BATCH_MAX_OPERATIONS']
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > limit:
+        return jsonify({'error': f'At most {limit} operations per batch'}), 400
+    for index, op in enumerate(operations):
+        if (not isinstance(op, dict) or type(op.get('id')) is not int
+                or op.get('action') not in ADDON_BATCH_ACTIONS
+                or not isinstance(op.get('payload') or {}, dict)):
+            return jsonify({'error': f'operations[{index}] needs an integer id, an action '
+                                     f"({', '.join(ADDON_BATCH_ACTIONS)}) and an optional payload object"}), 400
+    payload, status = run_addon_write(batch_addon_actions_write, get_jwt_identity(), operations)
+    return jsonify(payload), status
+
+# Add-on archive
+CLOSED_ADDON_STATUSES = ('completed', 'rejected')
+
+def _archive_candidates(status, cutoff, limit):
+    """Oldest ``limit`` requests in ``status`` closed before ``cutoff``.
+
+    Walks ix_add_on_request_status_created from the old end; moved rows
+    leave the index, so every batch starts at the front again.
+    """
+    # SQLite gives a new row max(rowid) + 1, so moving the newest request,
+    # or the request owning the newest log entry, would let its id be
+    # handed out again while the archive still holds it.
+    newest_request = db.select(func.max(AddOnRequest.id)).scalar_subquery()
+    newest_log_owner = db.select(AddOnLog.request_id).where(
+        AddOnLog.id == db.select(func.max(AddOnLog.id)).scalar_subquery()).scalar_subquery()
+    return db.session.query(AddOnRequest.id).filter(
+        AddOnRequest.status == status,
+        AddOnRequest.created_at < cutoff,
+        func.coalesce(AddOnRequest.completed_at, AddOnRequest.reviewed_at) < cutoff,
+        AddOnRequest.id != newest_request,
+        AddOnRequest.id != func.coalesce(newest_log_owner, 0),
+    ).order_by(AddOnRequest.created_at).limit(limit)
+
+def _archive_batch(request_ids, cutoff):
+    """Copy the requests and their log to the archive and delete them, in one transaction."""
+    requests, logs = AddOnRequest.__table__, AddOnLog.__table__
+    moved_logs = db.session.execute(insert(addon_log_archive).from_select(
+        [column.name for column in logs.columns],
+        db.select(logs).where(logs.c.request_id.in_(request_ids)))).rowcount
+    moved_requests = db.session.execute(insert(addon_request_archive).from_select(
+        [column.name for column in requests.columns],
+        db.select(requests).where(requests.c.id.in_(request_ids)))).rowcount
+    db.session.execute(logs.delete().where(logs.c.request_id.in_(request_ids)))
+    db.session.execute(requests.delete().where(requests.c.id.in_(request_ids)))
+    db.session.add(AddOnArchiveBatch(archived_at=datetime.utcnow(), cutoff=cutoff,
+                                     requests_moved=moved_requests, logs_moved=moved_logs))
+    db.session.commit()
+    return moved_requests, moved_logs
+
+def archive_addon_requests(older_than_days=None, batch_size=None, pause=0.05, now=None):
+    """Move completed/rejected requests closed more than ``older_than_days``
+    ago, with their log, to the archive tables.
+
+    Each batch of ``batch_size`` requests is its own short transaction,
+    followed by ``pause`` seconds without a write lock so request
+    handlers waiting on SQLite's busy timeout get in between batches.
+    Returns (requests moved, log entries moved, cutoff).
+    """
+    older_than_days = max(1, older_than_days or current_app.config['ADDON_ARCHIVE_AFTER_DAYS'])
+    batch_size = batch_size or current_app.config['ADDON_ARCHIVE_BATCH_SIZE']
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    total_requests = total_logs = 0
+    for status in CLOSED_ADDON_STATUSES:
+        while True:
+            request_ids = [request_id for request_id, in _archive_candidates(status, cutoff, batch_size)]
+            if not request_ids:
+                break
+            moved_requests, moved_logs = _archive_batch(request_ids, cutoff)
+            total_requests += moved_requests
+            total_logs += moved_logs
+            if pause:
+                time.sleep(pause)
+    return total_requests, total_logs, cutoff
+
+@bp.cli.command('archive-addon-requests')
+def archive_addon_requests_command():
+    """Move old completed/rejected add-on requests to the archive tables."""
+    moved_requests, moved_logs, cutoff = archive_addon_requests()
+    print(f"Archived {moved_requests} add-on requests and {moved_logs} log entries "
+          f"closed before {cutoff:%Y-%m-%d %H:%M}")
+
+# Add-on exports. Both tiers are read separately in (time, id) order and
+# merged, so an export streams from the indexes without sorting the union.
+Performer = aliased(User)
+
+def _addon_log_export(log, request_source):
+    return ListSerializer(log, [
+        ('id', log.id),
+        ('request_id', log.request_id),
+        ('ward_id', request_source.ward_id),
+        ('ward_name', Ward.name),
+        ('room_number', request_source.room_number),
+        ('patient_id', request_source.patient_id),
+        ('requested_test', request_source.requested_test),
+        ('request_status', request_source.status),
+        ('action', log.action),
+        ('performed_by', log.performed_by),
+        ('performer_name', Performer.name),
+        ('timestamp', log.timestamp, isoformat),
+        ('notes', log.notes),
+    ], joins=[
+        # The archiver moves a request and its log entries together
+        Join(request_source, log.request_id == request_source.id, outer=True),
+        Join(Ward, request_source.ward_id == Ward.id, outer=True),
+        Join(Performer, log.performed_by == Performer.id, outer=True),
+    ])
+
+# kind -> (time column name, [(serializer, row entity, request entity)] per tier)
+ADDON_EXPORTS = {
+    'requests': ('created_at', [
+        (_addon_request_list(source, extra=('reason_category', 'preventable')), source, source)
+        for source in (AddOnRequest, AddOnRequestArchived)
+    ]),
+    'logs': ('timestamp', [
+        (_addon_log_export(log, request_source), log, request_source)
+        for log, request_source in ((AddOnLog, AddOnRequest), (AddOnLogArchived, AddOnRequestArchived))
+    ]),
+}
+
+def addon_export_queries(kind, start=None, end=None, ward_id=None, status=None, action=None, after_id=None):
+    """One query per tier for an export of add-on ``kind`` ('requests' or 'logs').
+
+    Requests are filtered on created_at and log entries on timestamp, both
+    inclusive; ``ward_id`` and ``status`` apply to the (logged) request and
+    ``action`` to log entries. Each query is in (time, id) order and
+    ``after_id`` resumes after that row. Raises ValueError if it does not exist.
+    """
+    time_name, tiers = ADDON_EXPORTS[kind]
+    after = None
+    if after_id is not None:
+        for _, entity, _ in tiers:
+            at = db.session.query(getattr(entity, time_name)).filter(entity.id == after_id).first()
+            if at:
+                after = (at[0], after_id)
+                break
+        else:
+            raise ValueError(f'Unknown after_id {after_id}')
+
+    queries = []
+    for serializer, entity, request_source in tiers:
+        time_column = getattr(entity, time_name)
+        query = serializer.query(db.session).filter(*_range_conditions(time_column, start, end, inclusive=True))
+        if ward_id is not None:
+            query = query.filter(request_source.ward_id == ward_id)
+        if status:
+            query = query.filter(request_source.status == status)
+        if action and kind == 'logs':
+            query = query.filter(entity.action == action)
+        if after:
+            at, row_id = after
+            query = query.filter((time_column > at) | ((time_column == at) & (entity.id > row_id)))
+        queries.append(query.order_by(time_column, entity.id))
+    return queries
+
+def addon_export(kind, **filters):
+    """``(serializer, rows)``: the rows of addon_export_queries() merged into one order."""
+    time_name, tiers = ADDON_EXPORTS[kind]
+    queries = addon_export_queries(kind, **filters)
+    # Rows without a timestamp sort first, as they do in SQL
+    return tiers[0][0], merge_tiers(queries, key=lambda row: (getattr(row, time_name) or datetime.min, row.id))
+
+def _export_response(kind):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start_date, end_date = request.args.get('start_date'), request.args.get('end_date')
+        after_id = request.args.get('after_id')
+        if after_id and not after_id.isdigit():
+            raise ValueError('Invalid after_id')
+        serializer, rows = addon_export(
+            kind,
+            start=datetime.fromisoformat(start_date) if start_date else None,
+            end=datetime.fromisoformat(end_date) if end_date else None,
+            ward_id=request.args.get('ward_id', type=int),
+            status=request.args.get('status'),
+            action=request.args.get('action'),
+            after_id=int(after_id) if after_id else None,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = stream_response(export_chunks(fmt, serializer.keys, rows, serializer.dump), EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="addon-{kind}.{fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/api/addon-requests/export', methods=['GET'])
+@read_only
+@jwt_required()
+def export_addon_requests():
+    """Stream add-on requests from both tiers as CSV or NDJSON."""
+    return _export_response('requests')
+
+@bp.route('/api/addon-logs/export', methods=['GET'])
+@read_only
+@jwt_required()
+def export_addon_logs():
+    """Stream the add-on audit log from both tiers as CSV or NDJSON."""
+    return _export_response('logs')
+
+@bp.cli.command('export-addon-data')
+@click.argument('kind', type=click.Choice(list(ADDON_EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output', type=click.File('wb'), default='-', help='File to write (default stdout).')
+@click.option('--start-date', type=click.DateTime(), help='Earliest created_at/timestamp, inclusive.')
+@click.option('--end-date', type=click.DateTime(), help='Latest created_at/timestamp, inclusive.')
+@click.option('--ward-id', type=int)
+@click.option('--status', help='Request status.')
+@click.option('--action', help='Log action (logs only).')
+@click.option('--after-id', type=int, help='Resume after this row id.')
+def export_addon_data_command(kind, fmt, output, start_date, end_date, ward_id, status, action, after_id):
+    """Export add-on requests or audit log entries from both tiers."""
+    try:
+        serializer, rows = addon_export(kind, start=start_date, end=end_date, ward_id=ward_id,
+                                        status=status, action=action, after_id=after_id)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    for chunk in export_chunks(fmt, serializer.keys, rows, serializer.dump):
+        output.write(chunk)
+
+# Analytics helpers. Analytics cover both tiers: raw queries read
+# AddOnRequestAll, and archiving leaves the rollups untouched.
+ADDON_STATUSES = ('pending', 'approved', 'rejected', 'completed')
+
+def _day_shift_expr(column):
+    # Day shift runs 07:00-18:59, night shift the rest
+    hour = extract('hour', column)
+    return and_(hour >= 7, hour < 19)
+
+def _shift_of(created_at):
+    return 'day' if 7 <= created_at.hour < 19 else 'night'
+
+def _rollup_key(request_obj, status):
+    preventable = request_obj.preventable
+    if preventable is None:
+        # Inserted outside the API and not reclassified yet
+        preventable = reason_classifier.classify(request_obj.reason)[1]
+    return {
+        'ward_id': request_obj.ward_id,
+        'requested_test': request_obj.requested_test,
+        'status': status,
+        'shift': _shift_of(request_obj.created_at),
+        'preventable': preventable,
+    }
+
+def _floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _floor_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _ceil(value, floor, step):
+    floored = floor(value)
+    return floored if floored == value else floored + step
+
+def bump_rollups(request_obj, delta, status=None, batch=None):
+    """Add ``delta`` to the hourly and daily rollup rows of a request.
+
+    Runs in the caller's transaction, so the rollups commit or roll back
+    together with the request change. With a ``batch`` the delta is only
+    summed into ``batch.rollup_deltas`` for apply_rollup_deltas().
+    """
+    key = _rollup_key(request_obj, status or request_obj.status)
+    hour = _floor_hour(request_obj.created_at)
+    for model, bucket in ((AddOnRollupHourly, hour), (AddOnRollupDaily, _floor_day(hour))):
+        if batch is not None:
+            batch.rollup_deltas[model, bucket, tuple(key[name] for name in ROLLUP_DIMENSIONS)] += delta
+            continue
+        table = model.__table__
+        match = and_(table.c.bucket == bucket, *[table.c[name] == value for name, value in key.items()])
+        result = db.session.execute(
+            table.update().where(match).values(request_count=table.c.request_count + delta))
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(bucket=bucket, request_count=delta, **key))
+
+def move_rollups(request_obj, new_status, batch=None):
+    if request_obj.status != new_status:
+        bump_rollups(request_obj, -1, batch=batch)
+        bump_rollups(request_obj, 1, new_status, batch=batch)
+
+def apply_rollup_deltas(deltas):
+    """Write summed ``(model, bucket, key) -> delta`` changes with at most
+    one SELECT, UPDATE and INSERT per rollup table."""
+    for model in (AddOnRollupHourly, AddOnRollupDaily):
+        changes = {(bucket, key): delta for (target, bucket, key), delta in deltas.items()
+                   if target is model and delta}
+        if not changes:
+            continue
+        table = model.__table__
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.bucket, *[table.c[name] for name in ROLLUP_DIMENSIONS])
+            .where(table.c.bucket.in_({bucket for bucket, _ in changes}),
+                   table.c.ward_id.in_({key[0] for _, key in changes}))
+        ).all()
+        existing = {(row[1], tuple(row[2:])): row[0] for row in rows}
+        updates = [{'row_id': existing[change], 'delta': delta}
+                   for change, delta in changes.items() if change in existing]
+        inserts = [dict(zip(ROLLUP_DIMENSIONS, key), bucket=bucket, request_count=delta)
+                   for (bucket, key), delta in changes.items() if (bucket, key) not in existing]
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('row_id'))
+                .values(request_count=table.c.request_count + bindparam('delta')), updates)
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+
+def rebuild_rollups():
+    """Recompute both rollup tables from both add-on tiers in one transaction."""
+    hourly, daily = {}, {}
+    db.session.execute(AddOnRollupHourly.__table__.delete())
+    db.session.execute(AddOnRollupDaily.__table__.delete())
+    rows = db.session.query(
+        AddOnRequestAll.ward_id, AddOnRequestAll.requested_test, AddOnRequestAll.status,
+        AddOnRequestAll.reason, AddOnRequestAll.preventable, AddOnRequestAll.created_at
+    ).yield_per(5000)
+    total = 0
+    for request_obj in rows:
+        key = tuple(_rollup_key(request_obj, request_obj.status).values())
+        hour = _floor_hour(request_obj.created_at)
+        hourly[(hour,) + key] = hourly.get((hour,) + key, 0) + 1
+        daily[(_floor_day(hour),) + key] = daily.get((_floor_day(hour),) + key, 0) + 1
+        total += 1
+    for model, counts in ((AddOnRollupHourly, hourly), (AddOnRollupDaily, daily)):
+        mappings = [
+            dict(zip(('bucket',) + ROLLUP_DIMENSIONS, key), request_count=count)
+            for key, count in counts.items()
+        ]
+        for i in range(0, len(mappings), 1000):
+            db.session.execute(model.__table__.insert(), mappings[i:i + 1000])
+    db.session.commit()
+    return total, len(hourly), len(daily)
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the add-on rollup tables (e.g. after a backfill)."""
+    total, hourly, daily = rebuild_rollups()
+    print(f"Rolled up {total} add-on requests into {hourly} hourly and {daily} daily buckets")
+
+def reclassify_addon_reasons(batch_size=1000, unclassified_only=False):
+    """Re-run reason_classifier over both add-on tiers.
+
+    Walks each table by id in transactions of ``batch_size`` rows and
+    writes only rows whose category or preventable flag changed, then
+    rebuilds the rollups if any did. Returns the number of rows changed.
+    """
+    changed = 0
+    for table in (AddOnRequest.__table__, addon_request_archive):
+        update = table.update().where(table.c.id == bindparam('row_id')).values(
+            reason_category=bindparam('new_category'), preventable=bindparam('new_preventable'))
+        after = 0
+        while True:
+            query = db.select(table.c.id, table.c.reason, table.c.reason_category, table.c.preventable).where(
+                table.c.id > after)
+            if unclassified_only:
+                query = query.where(table.c.reason_category.is_(None))
+            rows = db.session.execute(query.order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                category, preventable = reason_classifier.classify(row.reason)
+                if (category, preventable) != (row.reason_category, row.preventable):
+                    updates.append({'row_id': row.id, 'new_category': category, 'new_preventable': preventable})
+            if updates:
+                db.session.execute(update, updates)
+            db.session.commit()
+            changed += len(updates)
+            after = rows[-1].id
+    if changed:
+        rebuild_rollups()
+    return changed
+
+@bp.cli.command('reclassify-addon-reasons')
+def reclassify_addon_reasons_command():
+    """Re-run the reason classifier over all add-on requests (after changing ADDON_REASON_RULES)."""
+    changed = reclassify_addon_reasons()
+    print(f"Reclassified {changed} add-on requests" + (" and rebuilt the rollups" if changed else ""))
+
+def _range_segments(start, end):
+    """Split the inclusive created_at range [start, end] for rollup queries.
+
+    Returns ``(days, hours, raw)``: half-open ``(lo, hi)`` ranges to read
+    from the daily and hourly rollups, and ``(lo, hi, inclusive)`` edges
+    narrower than an hour that must be counted from the request rows.
+    ``None`` means unbounded.
+    """
+    hour_lo = _ceil(start, _floor_hour, timedelta(hours=1)) if start else None
+    hour_hi = _floor_hour(end) if end else None
+    if hour_lo and hour_hi and hour_lo >= hour_hi:
+        return [], [], [(start, end, True)]
     
-    query = AddOnRequest.query
+    raw = []
+    if start and start < hour_lo:
+        raw.append((start, hour_lo, False))
+    if end:
+        raw.append((hour_hi, end, True))
     
-    if start_date:
-        query = query.filter(AddOnRequest.created_at >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(AddOnRequest.created_at <= datetime.fromisoformat(end_date))
+    day_lo = _ceil(hour_lo, _floor_day, timedelta(days=1)) if hour_lo else None
+    day_hi = _floor_day(hour_hi) if hour_hi else None
+    if day_lo and day_hi and day_lo >= day_hi:
+        return [], [(hour_lo, hour_hi)], raw
     
-    requests = query.all()
+    hours = []
+    if hour_lo and hour_lo < day_lo:
+        hours.append((hour_lo, day_lo))
+    if hour_hi and day_hi < hour_hi:
+        hours.append((day_hi, hour_hi))
+    return [(day_lo, day_hi)], hours, raw
+
+def _range_conditions(column, lo, hi, inclusive=False):
+    conditions = []
+    if lo is not None:
+        conditions.append(column >= lo)
+    if hi is not None:
+        conditions.append(column <= hi if inclusive else column < hi)
+    return conditions
+
+def _rollup_dimension_rows(start, end):
+    """Yield (ward_id, test, status, shift, preventable, count) for the range."""
+    days, hours, raw = _range_segments(start, end)
+    for model, ranges in ((AddOnRollupDaily, days), (AddOnRollupHourly, hours)):
+        dimensions = [getattr(model, name) for name in ROLLUP_DIMENSIONS]
+        for lo, hi in ranges:
+            yield from db.session.query(*dimensions, func.sum(model.request_count)).filter(
+                *_range_conditions(model.bucket, lo, hi)).group_by(*dimensions)
     
-    # Ward statistics
-    ward_stats = {}
-    test_stats = {}
-    reason_stats = {}
+    shift = case((_day_shift_expr(AddOnRequestAll.created_at), 'day'), else_='night')
+    dimensions = [AddOnRequestAll.ward_id, AddOnRequestAll.requested_test, AddOnRequestAll.status,
+                  shift, func.coalesce(AddOnRequestAll.preventable, False)]
+    for lo, hi, inclusive in raw:
+        yield from db.session.query(*dimensions, func.count(AddOnRequestAll.id)).filter(
+            *_range_conditions(AddOnRequestAll.created_at, lo, hi, inclusive)).group_by(*dimensions)
+
+def _counts_by_name(model, counts):
+    names = dict(db.session.query(model.id, model.name).filter(model.id.in_(counts)))
+    by_name = {}
+    for key, count in counts.items():
+        by_name[names.get(key)] = by_name.get(names.get(key), 0) + count
+    return by_name
+
+def _reason_user_counts(start, end):
+    # Rows imported outside the API are unclassified until reclassify-addon-reasons runs
+    category = func.coalesce(AddOnRequestAll.reason_category, reason_classifier.default_category)
+    return db.session.query(category, AddOnRequestAll.requested_by, func.count(AddOnRequestAll.id)).filter(
+        *_range_conditions(AddOnRequestAll.created_at, start, end, inclusive=True)
+    ).group_by(category, AddOnRequestAll.requested_by)
+
+def addon_stats(start=None, end=None):
+    """Add-on statistics for requests created in [start, end].
+
+    Everything except reason_stats and user_stats is summed from rollup
+    buckets (plus raw rows for partial hours at the range edges); those
+    two come from one GROUP BY over the requests in the range.
+    """
+    total = preventable_count = 0
+    ward_counts, test_stats = {}, {}
     shift_stats = {'day': 0, 'night': 0}
-    user_stats = {}
-    preventable_count = 0
+    status_breakdown = dict.fromkeys(ADDON_STATUSES, 0)
     
-    for req in requests:
-        # Ward stats
-        ward_name = req.ward.name
-        ward_stats[ward_name] = ward_stats.get(ward_name, 0) + 1
-        
-        # Test stats
-        test_stats[req.requested_test] = test_stats.get(req.requested_test, 0) + 1
-        
-        # Reason stats
-        reason_stats[req.reason] = reason_stats.get(req.reason, 0) + 1
-        
-        # Shift stats (would need to get from room or request time)
-        hour = req.created_at.hour
-        if 7 <= hour < 19:
-            shift_stats['day'] += 1
-        else:
-            shift_stats['night'] += 1
-        
-        # User stats
-        user_name = req.requester.name
-        user_stats[user_name] = user_stats.get(user_name, 0) + 1
-        
-        # Preventable (if reason indicates missing test)
-        if 'missing' in req.reason.lower() or 'forgot' in req.reason.lower():
-            preventable_count += 1
+    for ward_id, test, status, shift, preventable, count in _rollup_dimension_rows(start, end):
+        if not count:
+            continue
+        total += count
+        ward_counts[ward_id] = ward_counts.get(ward_id, 0) + count
+        test_stats[test] = test_stats.get(test, 0) + count
+        shift_stats[shift] += count
+        if status in status_breakdown:
+            status_breakdown[status] += count
+        if preventable:
+            preventable_count += count
     
-    total = len(requests)
-    preventable_percentage = (preventable_count / total * 100) if total > 0 else 0
+    reason_stats, user_counts = {}, {}
+    for category, user_id, count in _reason_user_counts(start, end):
+        reason_stats[category] = reason_stats.get(category, 0) + count
+        user_counts[user_id] = user_counts.get(user_id, 0) + count
     
-    return jsonify({
+    return {
         'total_requests': total,
-        'ward_stats': ward_stats,
+        'ward_stats': _counts_by_name(Ward, ward_counts),
         'test_stats': test_stats,
         'reason_stats': reason_stats,
         'shift_stats': shift_stats,
-        'user_stats': user_stats,
+        'user_stats': _counts_by_name(User, user_counts),
         'preventable_count': preventable_count,
-        'preventable_percentage': round(preventable_percentage, 2),
-        'status_breakdown': {
-            'pending': len([r for r in requests if r.status == 'pending']),
-            'approved': len([r for r in requests if r.status == 'approved']),
-            'rejected': len([r for r in requests if r.status == 'rejected']),
-            'completed': len([r for r in requests if r.status == 'completed'])
-        }
-    }), 200
+        'status_breakdown': status_breakdown
+    }
+
+def addon_daily_counts(start):
+    """Requests created per calendar day since ``start``, from the rollups."""
+    days, hours, raw = _range_segments(start, None)
+    daily_stats = {}
+    for model, ranges in ((AddOnRollupDaily, days), (AddOnRollupHourly, hours)):
+        for lo, hi in ranges:
+            rows = db.session.query(model.bucket, func.sum(model.request_count)).filter(
+                *_range_conditions(model.bucket, lo, hi)).group_by(model.bucket)
+            for bucket, count in rows:
+                date_key = bucket.date().isoformat()
+                daily_stats[date_key] = daily_stats.get(date_key, 0) + count
+    for lo, hi, inclusive in raw:
+        # Raw edges are shorter than an hour, so they fall on lo's date
+        count = db.session.query(func.count(AddOnRequestAll.id)).filter(
+            *_range_conditions(AddOnRequestAll.created_at, lo, hi, inclusive)).scalar()
+        date_key = lo.date().isoformat()
+        daily_stats[date_key] = daily_stats.get(date_key, 0) + count
+    return {date_key: count for date_key, count in daily_stats.items() if count}
+
+# Turnaround percentiles come from one pass over the stored durations into
+# a quantile sketch per (ward, test, urgency, shift) cell; the cells are
+# then merged into each breakdown, so memory depends on the number of
+# cells rather than of requests
+TURNAROUND_PERCENTILES = (50, 90, 99)
+TURNAROUND_ACCURACY = 0.01
+TURNAROUND_GROUPS = ('ward', 'test', 'urgency', 'shift')
 
-@app.route('/api/analytics/addon-trends', methods=['GET'])
+def _turnaround_sketches():
+    return {'review': QuantileSketch(TURNAROUND_ACCURACY), 'complete': QuantileSketch(TURNAROUND_ACCURACY)}
+
+def _turnaround_summary(sketches):
+    summary = {}
+    for metric, sketch in sketches.items():
+        summary[metric] = {'count': sketch.count}
+        for p in TURNAROUND_PERCENTILES:
+            value = sketch.quantile(p / 100)
+            summary[metric][f'p{p}'] = round(value) if value is not None else None
+    return summary
+
+def _turnaround_rows(start, end):
+    return db.session.query(
+        AddOnRequestAll.ward_id, AddOnRequestAll.requested_test,
+        case((AddOnRequestAll.is_urgent.is_(True), 'urgent'), else_='routine'),
+        case((_day_shift_expr(AddOnRequestAll.created_at), 'day'), else_='night'),
+        AddOnRequestAll.review_seconds, AddOnRequestAll.complete_seconds
+    ).filter(
+        *_range_conditions(AddOnRequestAll.created_at, start, end, inclusive=True),
+        AddOnRequestAll.review_seconds.is_not(None)
+    )
+
+def addon_turnaround(start=None, end=None):
+    """Time to review and to complete (seconds from creation) for requests
+    created in [start, end]: p50/p90/p99 overall and by ward, test,
+    urgency and shift, each within TURNAROUND_ACCURACY of the exact value."""
+    cells = {}
+    for ward_id, test, urgency, shift, review, complete in _turnaround_rows(start, end).yield_per(1000):
+        cell = cells.get((ward_id, test, urgency, shift))
+        if cell is None:
+            cell = cells[ward_id, test, urgency, shift] = _turnaround_sketches()
+        cell['review'].add(review)
+        if complete is not None:
+            cell['complete'].add(complete)
+    
+    overall = _turnaround_sketches()
+    groups = {name: {} for name in TURNAROUND_GROUPS}
+    for keys, cell in cells.items():
+        targets = [overall]
+        for name, key in zip(TURNAROUND_GROUPS, keys):
+            if key not in groups[name]:
+                groups[name][key] = _turnaround_sketches()
+            targets.append(groups[name][key])
+        for sketches in targets:
+            for metric, sketch in cell.items():
+                sketches[metric].merge(sketch)
+    
+    result = {'percentiles': list(TURNAROUND_PERCENTILES), 'overall': _turnaround_summary(overall)}
+    for name in TURNAROUND_GROUPS:
+        result[f'by_{name}'] = {key: _turnaround_summary(sketches) for key, sketches in groups[name].items()}
+    # Ward names need not be unique; a repeated name keeps its id
+    names = dict(db.session.query(Ward.id, Ward.name).filter(Ward.id.in_(result['by_ward'])))
+    by_ward = {}
+    for ward_id, summary in result['by_ward'].items():
+        name = names.get(ward_id, str(ward_id))
+        by_ward[f'{name} (#{ward_id})' if name in by_ward else name] = summary
+    result['by_ward'] = by_ward
+    return result
+
+# Analytics Routes
+@bp.route('/api/analytics/addon-stats', methods=['GET'])
+@read_only
+@jwt_required()
+def get_addon_stats():
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    stats = addon_stats(
+        datetime.fromisoformat(start_date) if start_date else None,
+        datetime.fromisoformat(end_date) if end_date else None
+    )
+    total = stats['total_requests']
+    preventable_percentage = (stats['preventable_count'] / total * 100) if total > 0 else 0
+    stats['preventable_percentage'] = round(preventable_percentage, 2)
+    return jsonify(stats), 200
+
+@bp.route('/api/analytics/addon-turnaround', methods=['GET'])
+@read_only
+@jwt_required()
+def get_addon_turnaround():
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    return jsonify(addon_turnaround(
+        datetime.fromisoformat(start_date) if start_date else None,
+        datetime.fromisoformat(end_date) if end_date else None
+    )), 200
+
+@bp.route('/api/analytics/addon-trends', methods=['GET'])
+@read_only
 @jwt_required()
 def get_addon_trends():
     days = int(request.args.get('days', 30))
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    requests = AddOnRequest.query.filter(AddOnRequest.created_at >= start_date).all()
-    
-    # Group by date
-    daily_stats = {}
-    for req in requests:
-        date_key = req.created_at.date().isoformat()
-        if date_key not in daily_stats:
-            daily_stats[date_key] = 0
-        daily_stats[date_key] += 1
+    daily_stats = addon_daily_counts(start_date)
     
     return jsonify({
         'daily_stats': daily_stats,
         'period_days': days
     }), 200
 
-# Initialize database and create admin user
-def init_db():
-    with app.app_context():
-        db.create_all()
-        
-        # Create default admin user if not exists
-        if not User.query.filter_by(username='admin').first():
-            admin = User(
-                username='admin',
-                email='admin@hospital.com',
-                password_hash=generate_password_hash('admin123'),
-                role='admin',
-                name='System Administrator'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ Admin user created: admin / admin123")
+# Dashboard
+def dashboard_summary(ward_id=None, now=None):
+    """Landing page counters for one ward (or all wards), from aggregate queries.
+
+    "Today" is the UTC day, matching the stored timestamps.
+    """
+    now = now or datetime.utcnow()
+    today = _floor_day(now)
+    
+    rooms = db.session.query(
+        func.count(Room.id),
+        func.count(case((func.coalesce(Room.primary_nurse_name, '') != '', Room.id)))
+    )
+    pending = db.session.query(
+        func.count(AddOnRequest.id),
+        func.count(case((AddOnRequest.is_urgent.is_(True), AddOnRequest.id)))
+    ).filter(AddOnRequest.status == 'pending')
+    created_today = db.session.query(func.coalesce(func.sum(AddOnRollupDaily.request_count), 0)).filter(
+        AddOnRollupDaily.bucket == today)
+    completed_today = db.session.query(func.count(AddOnRequest.id)).filter(
+        AddOnRequest.completed_at >= today, AddOnRequest.status == 'completed')
+    if ward_id is not None:
+        rooms = rooms.filter(Room.ward_id == ward_id)
+        pending = pending.filter(AddOnRequest.ward_id == ward_id)
+        created_today = created_today.filter(AddOnRollupDaily.ward_id == ward_id)
+        completed_today = completed_today.filter(AddOnRequest.ward_id == ward_id)
+    
+    total_rooms, rooms_staffed = rooms.one()
+    pending_requests, urgent_pending = pending.one()
+    return {
+        'date': today.date().isoformat(),
+        'ward_id': ward_id,
+        'total_rooms': total_rooms,
+        'rooms_staffed': rooms_staffed,
+        'pending_requests': pending_requests,
+        'urgent_pending': urgent_pending,
+        'today_requests': created_today.scalar(),
+        'completed_today': completed_today.scalar(),
+        'generated_at': now.isoformat()
+    }
+
+@bp.route('/api/dashboard/summary', methods=['GET'])
+@read_only
+@jwt_required()
+def get_dashboard_summary():
+    ward_id = request.args.get('ward_id')
+    if ward_id:
+        try:
+            ward_id = int(ward_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid ward_id'}), 400
+    else:
+        ward_id = None
+    
+    # Keyed by day too, so a cached summary never outlives midnight
+    key = (ward_id, datetime.utcnow().date())
+    summary = dashboard_cache.get(key, lambda _: dashboard_summary(ward_id))
+    return jsonify(summary), 200
+
+# Schema management
+def _hot_queries():
+    """Queries behind the busiest endpoints; none may fall back to a table scan."""
+    since = datetime(2000, 1, 1)
+    return {
+        'addon-requests by status': ADDON_REQUEST_LIST.query(db.session).filter(
+            AddOnRequest.status == 'pending').order_by(AddOnRequest.created_at.desc(), AddOnRequest.id.desc()),
+        'addon-requests by ward and status': ADDON_REQUEST_LIST.query(db.session).filter(
+            AddOnRequest.ward_id == 1, AddOnRequest.status == 'pending'
+        ).order_by(AddOnRequest.created_at.desc(), AddOnRequest.id.desc()),
+        'addon-requests by ward': ADDON_REQUEST_LIST.query(db.session).filter(
+            AddOnRequest.ward_id == 1).order_by(AddOnRequest.created_at.desc(), AddOnRequest.id.desc()),
+        'addon-requests with archived by status': ADDON_REQUEST_ALL_LIST.query(db.session).filter(
+            AddOnRequestAll.status == 'completed'
+        ).order_by(AddOnRequestAll.created_at.desc(), AddOnRequestAll.id.desc()),
+        'addon-stats raw edge': db.session.query(AddOnRequestAll.ward_id, func.count(AddOnRequestAll.id)).filter(
+            AddOnRequestAll.created_at >= since, AddOnRequestAll.created_at < since + timedelta(hours=1)
+        ).group_by(AddOnRequestAll.ward_id),
+        'addon-stats reasons and requesters': _reason_user_counts(since, None),
+        'addon archive candidates': _archive_candidates('completed', since, 500),
+        'addon reasons unclassified': db.session.query(AddOnRequestAll.id).filter(
+            AddOnRequestAll.reason_category.is_(None)),
+        'addon-turnaround by date': _turnaround_rows(since, None),
+        'addon-trends hourly rollup': db.session.query(
+            AddOnRollupHourly.bucket, func.sum(AddOnRollupHourly.request_count)
+        ).filter(AddOnRollupHourly.bucket >= since).group_by(AddOnRollupHourly.bucket),
+        'addon export requests by date': addon_export_queries('requests', start=since)[0],
+        'addon export archived requests by date': addon_export_queries('requests', start=since)[1],
+        'addon export log by date': addon_export_queries('logs', start=since)[0],
+        'addon export archived log by date': addon_export_queries('logs', start=since)[1],
+        'addon log by request': db.session.query(AddOnLog).filter(
+            AddOnLog.request_id == 1).order_by(AddOnLog.timestamp),
+        'dashboard completed today': db.session.query(func.count(AddOnRequest.id)).filter(
+            AddOnRequest.completed_at >= since, AddOnRequest.status == 'completed'),
+        'dashboard today rollup': db.session.query(func.sum(AddOnRollupDaily.request_count)).filter(
+            AddOnRollupDaily.bucket == since),
+        'rooms by ward': ROOM_LIST.query(db.session).filter(Room.ward_id == 1).order_by(Room.id),
+        'room history by ward and date': SHIFT_HISTORY_LIST.query(db.session).filter(
+            RoomShiftHistory.ward_id == 1, RoomShiftHistory.shift_date == since.date()),
+    }
 
-# Initialize on startup
-init_db()
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = upgrade_schema()
+    print(f"Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ''))
+
+@bp.cli.command('db-status')
+def db_status_command():
+    """List schema migrations not yet applied."""
+    pending = pending_migrations(db.engine)
+    for migration_id, description in pending:
+        print(f"pending  {migration_id}  {description}")
+    if not pending:
+        print("Schema is up to date")
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot query is planned as a full table scan (SQLite only)."""
+    failures = 0
+    with db.engine.connect() as connection:
+        for name, query in _hot_queries().items():
+            scans = full_table_scans(connection, query.statement)
+            if scans is None:
+                print(f"skip  {name} (EXPLAIN check needs SQLite)")
+            elif scans:
+                failures += 1
+                print(f"FAIL  {name}: full scan of {', '.join(scans)}")
+            else:
+                print(f"ok    {name}")
+    if failures:
+        raise SystemExit(1)
+
+# One-time setup: schema, migrations, derived data and the default admin.
+# Run by `flask bootstrap` at deploy time, never by the workers themselves.
+def upgrade_schema():
+    """Create missing tables, apply migrations and fill in derived columns
+    and tables left empty. Returns the ids of the migrations applied."""
+    db.create_all()
+    applied = apply_migrations(db.engine, current_app)
+    # Tables a migration dropped to change their key
+    db.create_all()
+    
+    # Requests stored before classification existed
+    if db.session.query(AddOnRequestAll.id).filter(AddOnRequestAll.reason_category.is_(None)).first():
+        reclassify_addon_reasons(unclassified_only=True)
+    
+    # Rollup tables added to (or recreated in) an existing database start out empty
+    if (not db.session.query(AddOnRollupDaily.id).first()
+            and db.session.query(AddOnRequestAll.id).first()):
+        rebuild_rollups()
+    return applied
+
+def bootstrap():
+    upgrade_schema()
+    
+    # Create default admin user if not exists
+    if not User.query.filter_by(username='admin').first():
+        admin = User(
+            username='admin',
+            email='admin@hospital.com',
+            password_hash=generate_password_hash('admin123'),
+            role='admin',
+            name='System Administrator'
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("✅ Admin user created: admin / admin123")
+
+@bp.cli.command('bootstrap')
+def bootstrap_command():
+    """Create tables, apply migrations and create the default admin user."""
+    bootstrap()
+
+# Application factory
+def create_app(config=None):
+    """Build a configured app.
+
+    Does no schema or seed work and opens no database connection, so it
+    is cheap in every worker and safe to run in the gunicorn master with
+    --preload (workers then share the imported code copy-on-write).
+    """
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    read_engine = read_bind(app.config)
+    if read_engine:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[READ_BIND] = read_engine
+    db.init_app(app)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            apply_profile(engine, app.config, read_only=key == READ_BIND)
+    jwt.init_app(app)
+    CORS(app, expose_headers=['ETag', 'Last-Modified', 'X-Next-Cursor'])
+    if app.config['METRICS_ENABLED']:
+        instrumentation.init_app(app)
+    _shift_timezone(app.config)  # fail at startup on an unknown zone
+    identity_cache.ttl = app.config['IDENTITY_CACHE_TTL']
+    dashboard_cache.ttl = app.config['DASHBOARD_CACHE_SECONDS']
+    directory_cache.maxsize = app.config['DIRECTORY_CACHE_SIZE']
+    directory_shared_cache.path = app.config['DIRECTORY_CACHE_PATH'] or None
+    directory_shared_cache.maxsize = app.config['DIRECTORY_CACHE_SHARED_SIZE']
+    instrumentation.caches.update(identity=identity_cache, dashboard=dashboard_cache,
+                                  directory=directory_cache, directory_shared=directory_shared_cache)
+    password_pool.init_app(app)
+    reason_classifier.init_app(app)
+    group_committer.init_app(app)
+    notification_dispatcher.init_app(app)
+    addon_change_feed.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        bootstrap()
     app.run(debug=True, port=5000)
-
@@ -0,0 +1,13 @@
+"""Performance benchmarks for the backend.
+
+Run from the ``backend`` directory, e.g. ``python -m benchmarks.search_latency``.
+"""
+
+
+def load_app(**config):
+    """Import the backend and return ``(module, app)`` with its database bootstrapped."""
+    import app as module
+    app = module.create_app(config or None)
+    with app.app_context():
+        module.bootstrap()
+    return module, app
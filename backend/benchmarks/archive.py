@@ -0,0 +1,120 @@
+"""Add-on archiving: mover throughput and its effect on concurrent writes.
+
+Moves closed requests older than ADDON_ARCHIVE_AFTER_DAYS out of the
+synthetic dataset while writer threads keep creating add-on requests,
+and reports the longest batch transaction (how long writers can be
+held off) and writer latency during the run against an idle baseline.
+
+    python -m benchmarks.archive --scale medium --batch-size 500 50000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import load_app
+from benchmarks.dataset import SCALES, populate
+from benchmarks.search_latency import _percentile
+
+
+def _writers(app, token, ward_id, n_threads, stop):
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        own, i = [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post('/api/addon-requests', headers=headers, json={
+                'ward_id': ward_id, 'room_number': '101', 'patient_id': f'PA{index}-{i}',
+                'requested_test': 'CBC', 'reason': 'Benchmark',
+            })
+            own.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 201, response.status_code
+            i += 1
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    return threads, latencies
+
+
+def _write_latency(app, token, ward_id, n_threads, seconds=None, during=None):
+    stop = threading.Event()
+    threads, latencies = _writers(app, token, ward_id, n_threads, stop)
+    result = during() if during else time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, result
+
+
+def run(scale, batch_size, n_threads):
+    module, app = load_app()
+    populate(module, app, SCALES[scale])
+    with app.app_context():
+        user = module.User.query.filter_by(username='admin').first()
+        token = module.create_access_token(identity=user.id)
+        ward_id = module.db.session.query(module.Ward.id).first()[0]
+        hot_before = module.db.session.query(module.AddOnRequest).count()
+
+    batches = []
+    archive_batch = module._archive_batch
+
+    def timed_batch(request_ids, cutoff):
+        start = time.perf_counter()
+        try:
+            return archive_batch(request_ids, cutoff)
+        finally:
+            batches.append((time.perf_counter() - start) * 1000)
+
+    def archive():
+        start = time.perf_counter()
+        with app.app_context():
+            moved = module.archive_addon_requests(batch_size=batch_size)
+        return moved, time.perf_counter() - start
+
+    idle, _ = _write_latency(app, token, ward_id, n_threads, seconds=2)
+    module._archive_batch = timed_batch
+    try:
+        busy, ((requests, logs, _), elapsed) = _write_latency(app, token, ward_id, n_threads, during=archive)
+    finally:
+        module._archive_batch = archive_batch
+
+    print(f'  batch {batch_size:<6} moved {requests} requests / {logs} logs of {hot_before} in {elapsed:6.2f} s   '
+          f'{len(batches)} batches, longest {max(batches, default=0):7.1f} ms   '
+          f'writes p50/p99 idle {statistics.median(idle):6.2f}/{_percentile(idle, 99):6.2f} ms, '
+          f'archiving {statistics.median(busy):6.2f}/{_percentile(busy, 99):6.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[100, 500, 5000])
+    parser.add_argument('--threads', type=int, default=1, help='concurrent writer threads')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.scale, args.batch_size[0], args.threads)
+        return
+
+    for batch_size in args.batch_size:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                       DIRECTORY_CACHE_PATH=os.path.join(tmp, 'directory.sqlite'))
+            subprocess.run([sys.executable, '-m', 'benchmarks.archive', '--child', '--scale', args.scale,
+                            '--batch-size', str(batch_size), '--threads', str(args.threads)],
+                           env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Read/write contention between worker processes sharing one SQLite file.
+
+Starts reader and writer processes, each building its own app the way a
+gunicorn worker does, against the same database. Readers list add-on
+requests and load the analytics while writers create add-on requests.
+Reports throughput, latency and "database is locked" failures for each
+DATABASE_PROFILE.
+
+    python -m benchmarks.contention --readers 4 --writers 2 --seconds 10
+    python -m benchmarks.contention --profile wal --threads 4 --read-pool 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from benchmarks import load_app
+from benchmarks.dataset import SCALES, populate
+from benchmarks.search_latency import _percentile
+
+READ_PATHS = [
+    '/api/addon-requests?limit=50',
+    '/api/addon-requests?status=pending&limit=50',
+    '/api/analytics/addon-stats',
+    '/api/dashboard/summary',
+]
+
+
+def _worker(role, client, headers, ward_id, stop, results, index):
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        if role == 'writer':
+            response = client.post('/api/addon-requests', headers=headers, json={
+                'ward_id': ward_id, 'room_number': '101', 'patient_id': f'PC{os.getpid()}-{index}-{i}',
+                'requested_test': 'CBC', 'reason': 'Benchmark',
+            })
+        else:
+            response = client.get(READ_PATHS[i % len(READ_PATHS)], headers=headers)
+        body = response.get_data()
+        ok = response.status_code < 400
+        if ok:
+            error = None
+        elif response.status_code == 503 and b'locked' in body:
+            error = 'locked'
+        else:
+            error = str(response.status_code)
+        elapsed = (time.perf_counter() - start) * 1000
+        response.close()
+        results.append(elapsed if ok else error)
+        i += 1
+
+
+def child(role, seconds, n_threads):
+    # DATABASE_URL, DATABASE_PROFILE and DATABASE_READ_POOL_SIZE come from the environment
+    module, app = load_app()
+    # Report driver errors ("database is locked") instead of a bare 500
+    app.register_error_handler(OperationalError, lambda exc: (str(exc.orig), 503))
+    with app.app_context():
+        user = module.User.query.filter_by(username='admin').first()
+        token = module.create_access_token(identity=user.id)
+        ward_id = module.db.session.query(module.Ward.id).first()[0]
+    headers = {'Authorization': f'Bearer {token}'}
+    app.test_client().get('/api/auth/me', headers=headers)
+
+    # Wait for every process to be ready, then run for a fixed time
+    print('ready', flush=True)
+    sys.stdin.readline()
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=_worker, args=(role, app.test_client(), headers, ward_id, stop, results, i))
+               for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(results), flush=True)
+
+
+def _report(label, role, results, seconds):
+    latencies = [r for r in results if not isinstance(r, str)]
+    errors = [r for r in results if isinstance(r, str)]
+    locked = errors.count('locked')
+    line = f'  {label:<14} {role:<7} {len(latencies) / seconds:8.1f} req/s'
+    if latencies:
+        line += f'   p50 {statistics.median(latencies):7.2f} ms   p99 {_percentile(latencies, 99):8.2f} ms'
+    print(f'{line}   errors {len(errors)} ({locked} locked)')
+
+
+def run(profile, read_pool, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   DIRECTORY_CACHE_PATH=os.path.join(tmp, 'directory.sqlite'),
+                   DATABASE_PROFILE=profile, DATABASE_READ_POOL_SIZE=str(read_pool),
+                   WORKER_THREADS=str(args.threads))
+        subprocess.run([sys.executable, '-m', 'benchmarks.contention', '--setup', '--scale', args.scale],
+                       env=env, check=True)
+
+        roles = ['reader'] * args.readers + ['writer'] * args.writers
+        procs = [subprocess.Popen([sys.executable, '-m', 'benchmarks.contention', '--child', role,
+                                   '--seconds', str(args.seconds), '--threads', str(args.threads)],
+                                  env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for role in roles]
+        for proc in procs:
+            assert proc.stdout.readline().strip() == 'ready'
+        for proc in procs:
+            proc.stdin.write('go\n')
+            proc.stdin.flush()
+        by_role = {'reader': [], 'writer': []}
+        for role, proc in zip(roles, procs):
+            out, _ = proc.communicate()
+            assert proc.returncode == 0, proc.returncode
+            by_role[role].extend(json.loads(out))
+
+    label = f'{profile}+read{read_pool}' if read_pool else profile
+    for role, results in by_role.items():
+        if results:
+            _report(label, role, results, args.seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--profile', choices=['stock', 'wal'], nargs='+', default=['stock', 'wal'])
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='writer processes')
+    parser.add_argument('--threads', type=int, default=1, help='threads per process')
+    parser.add_argument('--read-pool', type=int, default=0, help='DATABASE_READ_POOL_SIZE for the wal profile')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child', choices=['reader', 'writer'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        module, app = load_app()
+        populate(module, app, SCALES[args.scale])
+        return
+    if args.child:
+        child(args.child, args.seconds, args.threads)
+        return
+
+    print(f'{args.readers} readers, {args.writers} writers x {args.threads} threads, '
+          f'{args.scale} dataset, {args.seconds:g} s')
+    for profile in args.profile:
+        run(profile, 0, args)
+        if profile == 'wal' and args.read_pool:
+            run(profile, args.read_pool, args)
+
+
+if __name__ == '__main__':
+    main()
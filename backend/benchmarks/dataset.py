@@ -0,0 +1,197 @@
+"""Synthetic hospital dataset for benchmarks.
+
+Generates wards, rooms, users by role and years of add-on request
+history with matching audit log entries, then rebuilds the analytics
+rollups. Request volume follows the shape of a real lab: more requests
+on day shift, a share of urgent and preventable ("missing", "forgot")
+requests, and pending work only in the last few days.
+
+    DATABASE_URL=sqlite:////tmp/ward_bench.db python -m benchmarks.dataset --scale medium
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks import load_app
+from benchmarks.search_latency import FIRST_NAMES, LAST_NAMES
+
+Scale = namedtuple('Scale', 'wards rooms_per_ward years requests_per_day users_per_role')
+
+SCALES = {
+    'small': Scale(wards=6, rooms_per_ward=20, years=0.25, requests_per_day=40, users_per_role=5),
+    'medium': Scale(wards=30, rooms_per_ward=40, years=1, requests_per_day=120, users_per_role=20),
+    'large': Scale(wards=60, rooms_per_ward=40, years=3, requests_per_day=250, users_per_role=50),
+}
+
+ROLES = ('charge_nurse', 'lab_staff', 'quality', 'admin')
+
+# Every generated user signs in with this password
+PASSWORD = 'bench-password'
+
+TESTS = ['CBC', 'BMP', 'CMP', 'Troponin', 'Lactate', 'PT/INR', 'Magnesium', 'Lipase',
+         'Blood culture', 'TSH', 'HbA1c', 'Type and screen']
+REASONS = ['Physician request after rounds', 'Clinical change', 'New admission workup',
+           'Missing from morning draw', 'Forgot to order with AM labs', 'Follow-up on abnormal result',
+           'Consultant request', 'Pre-procedure requirement']
+REJECTION_REASONS = ['Sample too old', 'Insufficient volume', 'Hemolyzed sample', 'Duplicate request']
+
+# Requests older than this are all resolved
+PENDING_WINDOW = timedelta(days=3)
+CHUNK = 10000
+
+
+def _name(rnd):
+    return f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+
+
+def _insert(db, table, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[i:i + CHUNK])
+
+
+def _users(module, scale, rnd):
+    password_hash = generate_password_hash(PASSWORD)
+    rows, by_role = [], {}
+    next_id = (module.db.session.query(module.func.max(module.User.id)).scalar() or 0) + 1
+    for role in ROLES:
+        for i in range(scale.users_per_role):
+            rows.append({
+                'id': next_id, 'username': f'{role}{i}', 'email': f'{role}{i}@bench.hospital',
+                'password_hash': password_hash, 'role': role, 'name': _name(rnd),
+            })
+            by_role.setdefault(role, []).append(next_id)
+            next_id += 1
+    _insert(module.db, module.User.__table__, rows)
+    return by_role
+
+
+def _request_times(scale, rnd, end):
+    days = max(1, int(scale.years * 365))
+    start = end - timedelta(days=days)
+    total = days * scale.requests_per_day
+    times = []
+    for _ in range(total):
+        day = start + timedelta(days=rnd.randrange(days))
+        # Roughly two thirds of add-ons are requested on day shift (07:00-18:59)
+        hour = rnd.randint(7, 18) if rnd.random() < 0.66 else rnd.choice([19, 20, 21, 22, 23, 0, 1, 2, 3, 4, 5, 6])
+        times.append(day.replace(hour=hour, minute=rnd.randrange(60), second=rnd.randrange(60), microsecond=0))
+    times.sort()
+    return [t for t in times if t < end]
+
+
+def _lifecycle(created_at, end, rnd):
+    """Return (status, reviewed_at, completed_at) for a request created at ``created_at``."""
+    if end - created_at < PENDING_WINDOW and rnd.random() < 0.35:
+        return 'pending', None, None
+    reviewed_at = min(end, created_at + timedelta(minutes=rnd.randint(5, 240)))
+    if rnd.random() < 0.15:
+        return 'rejected', reviewed_at, None
+    if end - created_at < PENDING_WINDOW and rnd.random() < 0.3:
+        return 'approved', reviewed_at, None
+    return 'completed', reviewed_at, min(end, reviewed_at + timedelta(minutes=rnd.randint(20, 600)))
+
+
+def populate(module, app, scale, seed=0, end=None):
+    """Fill an empty database through ``module`` (the imported ``app``) and ``app``."""
+    rnd = random.Random(seed)
+    end = end or datetime.utcnow().replace(microsecond=0)
+    db = module.db
+    with app.app_context():
+        users = _users(module, scale, rnd)
+        nurses, lab = users['charge_nurse'], users['lab_staff']
+
+        first_ward = (db.session.query(module.func.max(module.Ward.id)).scalar() or 0) + 1
+        ward_ids = list(range(first_ward, first_ward + scale.wards))
+        _insert(db, module.Ward.__table__, [{'id': ward_id, 'name': f'Ward {i + 1}'}
+                                            for i, ward_id in enumerate(ward_ids)])
+        rooms = []
+        for ward_id in ward_ids:
+            for number in range(scale.rooms_per_ward):
+                rooms.append({
+                    'ward_id': ward_id,
+                    'room_number': str(100 + number),
+                    'patient_name': _name(rnd) if rnd.random() < 0.85 else None,
+                    'patient_id': f'P{rnd.randint(100000, 999999)}',
+                    'primary_nurse_name': _name(rnd),
+                    'primary_nurse_extension': str(rnd.randint(1000, 9999)),
+                    'backup_nurse_name': _name(rnd) if rnd.random() < 0.5 else None,
+                    'backup_nurse_extension': str(rnd.randint(1000, 9999)) if rnd.random() < 0.5 else None,
+                    'charge_nurse_name': _name(rnd),
+                    'shift_type': 'day',
+                    'updated_at': end,
+                })
+        _insert(db, module.Room.__table__, rooms)
+
+        next_id = (db.session.query(module.func.max(module.AddOnRequest.id)).scalar() or 0) + 1
+        requests, logs = [], []
+        for request_id, created_at in enumerate(_request_times(scale, rnd, end), start=next_id):
+            status, reviewed_at, completed_at = _lifecycle(created_at, end, rnd)
+            requested_by, reviewed_by = rnd.choice(nurses), rnd.choice(lab) if reviewed_at else None
+            row = {
+                'id': request_id,
+                'ward_id': rnd.choice(ward_ids),
+                'room_number': str(100 + rnd.randrange(scale.rooms_per_ward)),
+                'patient_id': f'P{rnd.randint(100000, 999999)}',
+                'requested_test': rnd.choice(TESTS),
+                'reason': rnd.choice(REASONS),
+                'is_urgent': rnd.random() < 0.2,
+                'has_previous_sample': rnd.random() < 0.6,
+                'status': status,
+                'rejection_reason': rnd.choice(REJECTION_REASONS) if status == 'rejected' else None,
+                'approval_action': rnd.choice(['add_to_same_sample', 'need_new_sample'])
+                if status in ('approved', 'completed') else None,
+                'requested_by': requested_by,
+                'reviewed_by': reviewed_by,
+                'created_at': created_at,
+                'reviewed_at': reviewed_at,
+                'completed_at': completed_at,
+            }
+            row['reason_category'], row['preventable'] = module.reason_classifier.classify(row['reason'])
+            row['review_seconds'] = module.turnaround_seconds(created_at, reviewed_at) if reviewed_at else None
+            row['complete_seconds'] = module.turnaround_seconds(created_at, completed_at) if completed_at else None
+            requests.append(row)
+            logs.append({'request_id': request_id, 'action': 'created', 'performed_by': requested_by,
+                         'timestamp': created_at, 'notes': 'Add-on request created'})
+            if reviewed_at:
+                logs.append({'request_id': request_id, 'action': 'rejected' if status == 'rejected' else 'approved',
+                             'performed_by': reviewed_by, 'timestamp': reviewed_at, 'notes': None})
+            if completed_at:
+                logs.append({'request_id': request_id, 'action': 'completed', 'performed_by': reviewed_by,
+                             'timestamp': completed_at, 'notes': 'Add-on test completed'})
+            if len(requests) >= CHUNK:
+                _insert(db, module.AddOnRequest.__table__, requests)
+                requests = []
+        _insert(db, module.AddOnRequest.__table__, requests)
+        # Audit log ids follow event time, as they would in production
+        logs.sort(key=lambda row: row['timestamp'])
+        _insert(db, module.AddOnLog.__table__, logs)
+        db.session.commit()
+        module.rebuild_rollups()
+        return {
+            'wards': len(ward_ids),
+            'rooms': len(rooms),
+            'users': sum(len(ids) for ids in users.values()),
+            'addon_requests': db.session.query(module.func.count(module.AddOnRequest.id)).scalar(),
+            'addon_logs': len(logs),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    module, app = load_app()
+    start = time.perf_counter()
+    summary = populate(module, app, SCALES[args.scale], seed=args.seed)
+    print(', '.join(f'{key}={value}' for key, value in summary.items()),
+          f'({time.perf_counter() - start:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
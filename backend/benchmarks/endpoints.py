@@ -0,0 +1,400 @@
+"""Per-endpoint load test over the synthetic dataset.
+
+Drives every API endpoint through the Flask test client (one request at
+a time, counting SQL statements per request) and optionally over a local
+gunicorn with concurrent clients. Reports throughput, p50/p95/p99
+latency and statements per request, and can save or compare a JSON
+baseline:
+
+    python -m benchmarks.endpoints --scale small
+    python -m benchmarks.endpoints --scale small --gunicorn --concurrency 8
+    python -m benchmarks.endpoints --scale small --save benchmarks/baselines/small.json
+    python -m benchmarks.endpoints --scale small --compare benchmarks/baselines/small.json
+    python -m benchmarks.endpoints --scale medium --archive
+
+``--archive`` runs the add-on archiver (default ADDON_ARCHIVE_AFTER_DAYS)
+on the dataset before measuring, for comparing hot-table sizes.
+
+``--compare`` exits with status 1 when an endpoint's median latency grew
+by more than ``--tolerance`` or it issues more SQL statements than the
+baseline. The median is compared because p95 over a few dozen requests
+is too noisy to gate on; statement counts are exact.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from benchmarks import load_app
+from benchmarks.dataset import PASSWORD, SCALES, populate
+from benchmarks.search_latency import _percentile
+
+# ``make(ctx, i)`` returns ``(path, json_body)``; ``repeat`` scales the
+# iteration count for endpoints that are slow by design (full lists);
+# ``collect`` names a Context pool that receives the ``id`` of each response.
+Scenario = namedtuple('Scenario', 'name method make repeat collect')
+Scenario.__new__.__defaults__ = (1.0, None)
+
+# Noise floor (ms) below which latency changes are never reported as regressions
+MIN_REGRESSION_MS = 2.0
+
+
+def _get(path):
+    return lambda ctx, i: (path.format(**ctx.params), None)
+
+
+def _search(queries):
+    return lambda ctx, i: (f'/api/critical-call/search?{queries[i % len(queries)]}', None)
+
+
+def _bulk_rooms(ctx, i):
+    ward_id = ctx.ward_ids[i % len(ctx.ward_ids)]
+    rooms = [dict(room, primary_nurse_name=f'Nurse {i}-{n}', primary_nurse_extension=str(2000 + n))
+             for n, room in enumerate(ctx.rooms_by_ward[ward_id])]
+    return '/api/rooms/bulk', {'rooms': rooms}
+
+
+def _create(ctx, i):
+    return '/api/addon-requests', {
+        'ward_id': ctx.ward_ids[i % len(ctx.ward_ids)], 'room_number': '101',
+        'patient_id': f'PB{i}', 'requested_test': 'CBC', 'reason': 'Benchmark request',
+        'is_urgent': i % 5 == 0,
+    }
+
+
+def _transition(action, pool, body):
+    def make(ctx, i):
+        request_id = getattr(ctx, pool).pop()
+        if action == 'approve':
+            ctx.approved.append(request_id)
+        return f'/api/addon-requests/{request_id}/{action}', body
+    return make
+
+
+# Operations per POST /api/addon-requests/batch; half approve, half reject
+BATCH_OPERATIONS = 10
+
+
+def _batch(ctx, i):
+    operations = []
+    for n in range(BATCH_OPERATIONS):
+        request_id = ctx.pending.pop()
+        if n % 2:
+            operations.append({'id': request_id, 'action': 'reject', 'payload': {'reason': 'Sample too old'}})
+        else:
+            ctx.approved.append(request_id)
+            operations.append({'id': request_id, 'action': 'approve', 'payload': {'action': 'add_to_same_sample'}})
+    return '/api/addon-requests/batch', {'operations': operations}
+
+
+READS = [
+    Scenario('index', 'GET', _get('/')),
+    Scenario('auth.me', 'GET', _get('/api/auth/me')),
+    Scenario('wards.list', 'GET', _get('/api/wards')),
+    Scenario('rooms.list', 'GET', _get('/api/rooms'), 0.2),
+    Scenario('rooms.list.ward', 'GET', _get('/api/rooms?ward_id={ward_id}')),
+    Scenario('rooms.list.page', 'GET', _get('/api/rooms?limit=100')),
+    Scenario('rooms.history', 'GET', _get('/api/rooms/history?date={today}')),
+    Scenario('search', 'GET', _search(['q=jo', 'q=P12', 'q=sar&type=nurse', 'q=10&type=room',
+                                       'q=ward%201&type=ward', 'q=smith&type=patient', 'q=nomatch'])),
+    Scenario('search.ward', 'GET', _search(['q=jo&ward_id=1', 'q=al&ward_id=2&type=nurse'])),
+    Scenario('addon.list', 'GET', _get('/api/addon-requests'), 0.1),
+    Scenario('addon.list.page', 'GET', _get('/api/addon-requests?limit=100')),
+    Scenario('addon.list.pending', 'GET', _get('/api/addon-requests?status=pending&ward_id={ward_id}')),
+    Scenario('addon.list.archived', 'GET', _get('/api/addon-requests?include_archived=1&status=completed&limit=100')),
+    Scenario('addon.changes', 'GET', _get('/api/addon-requests/changes?since=0&timeout=0')),
+    Scenario('addon.export.csv', 'GET', _get('/api/addon-requests/export?format=csv'), 0.1),
+    Scenario('addon.export.ndjson', 'GET', _get('/api/addon-requests/export?format=ndjson'), 0.1),
+    Scenario('addon.log.export.csv', 'GET', _get('/api/addon-logs/export?format=csv&start_date={month_ago}'), 0.2),
+    Scenario('addon.log.export.ndjson', 'GET',
+             _get('/api/addon-logs/export?format=ndjson&start_date={month_ago}'), 0.2),
+    Scenario('analytics.stats', 'GET', _get('/api/analytics/addon-stats'), 0.5),
+    Scenario('analytics.stats.range', 'GET',
+             _get('/api/analytics/addon-stats?start_date={month_ago}T05:30:00&end_date={today}T13:15:00'), 0.5),
+    Scenario('analytics.trends', 'GET', _get('/api/analytics/addon-trends')),
+    Scenario('analytics.turnaround', 'GET', _get('/api/analytics/addon-turnaround'), 0.5),
+    Scenario('analytics.turnaround.range', 'GET',
+             _get('/api/analytics/addon-turnaround?start_date={month_ago}&end_date={today}T23:59:59'), 0.5),
+    Scenario('dashboard.summary', 'GET', _get('/api/dashboard/summary')),
+    Scenario('dashboard.summary.ward', 'GET', _get('/api/dashboard/summary?ward_id={ward_id}')),
+]
+
+WRITES = [
+    Scenario('auth.login', 'POST', lambda ctx, i: ('/api/auth/login', {'username': 'lab_staff0', 'password': PASSWORD}), 0.2),
+    Scenario('auth.register', 'POST', lambda ctx, i: ('/api/auth/register', {
+        'username': f'bench{ctx.run}-{i}', 'email': f'bench{ctx.run}-{i}@bench.hospital',
+        'password': PASSWORD, 'role': 'charge_nurse', 'name': 'Bench User'}), 0.2),
+    Scenario('wards.create', 'POST', lambda ctx, i: ('/api/wards', {'name': f'Bench ward {ctx.run}-{i}'}), 0.2),
+    Scenario('rooms.bulk', 'POST', _bulk_rooms),
+    Scenario('addon.create', 'POST', _create, collect='pending'),
+    Scenario('addon.batch', 'POST', _batch, 0.2),
+    Scenario('addon.approve', 'POST', _transition('approve', 'pending', {'action': 'add_to_same_sample'})),
+    Scenario('addon.reject', 'POST', _transition('reject', 'pending', {'reason': 'Sample too old'})),
+    Scenario('addon.complete', 'POST', _transition('complete', 'approved', None)),
+]
+
+
+class Context:
+    """Ids and parameters the scenarios draw from; pools shrink as writes consume them."""
+
+    def __init__(self, module, app, token):
+        self.token = token
+        self.run = 0
+        with app.app_context():
+            db, Room, AddOnRequest = module.db, module.Room, module.AddOnRequest
+            self.ward_ids = [ward_id for ward_id, in db.session.query(module.Ward.id).order_by(module.Ward.id)]
+            self.rooms_by_ward = {}
+            for row in module.ROOM_LIST.query(db.session).order_by(Room.id):
+                room = module.ROOM_LIST.dump(row)
+                self.rooms_by_ward.setdefault(room['ward_id'], []).append(
+                    {key: room[key] for key in ('id',) + module.ROOM_FIELDS if key in room})
+            self.pending = [i for i, in db.session.query(AddOnRequest.id).filter_by(status='pending')]
+            self.approved = [i for i, in db.session.query(AddOnRequest.id).filter_by(status='approved')]
+        today = datetime.utcnow().date()
+        self.params = {'ward_id': self.ward_ids[0], 'today': today.isoformat(),
+                       'month_ago': (today - timedelta(days=30)).isoformat()}
+
+    def available(self, scenario, count):
+        if scenario.name == 'addon.batch':
+            # At most a quarter of the pending requests, for addon.approve and addon.reject
+            return min(count, len(self.pending) // (4 * BATCH_OPERATIONS))
+        if scenario.name == 'addon.approve':
+            # Leave half of the pending requests for addon.reject
+            return min(count, len(self.pending) // 2)
+        pool = {'addon.reject': self.pending, 'addon.complete': self.approved}.get(scenario.name)
+        return count if pool is None else min(count, len(pool))
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _summarize(latencies, elapsed, statements=None):
+    result = {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+    }
+    if statements is not None:
+        result['statements'] = statements
+    return result
+
+
+def run_test_client(module, app, ctx, scenarios, iterations):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {ctx.token}'}
+    with app.app_context():
+        counter = StatementCounter(module.db.engine)
+    results = {}
+    for scenario in scenarios:
+        count = ctx.available(scenario, max(1, int(iterations * scenario.repeat)))
+        if not count:
+            continue
+        latencies, statements = [], []
+        start = time.perf_counter()
+        for i in range(count):
+            path, body = scenario.make(ctx, i)
+            before = counter.count
+            t0 = time.perf_counter()
+            response = client.open(path, method=scenario.method, headers=headers, json=body)
+            response.get_data()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statements.append(counter.count - before)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{scenario.name}: {path} returned {response.status_code}')
+            if scenario.collect:
+                getattr(ctx, scenario.collect).append(response.json['id'])
+        results[scenario.name] = _summarize(latencies, time.perf_counter() - start,
+                                            int(statistics.median(statements)))
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_gunicorn(workers, threads):
+    port = _free_port()
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--worker-class', 'gthread',
+         '--threads', str(threads), '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:create_app()'],
+        cwd=backend, env=dict(os.environ, WORKER_THREADS=str(threads)), stdout=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(url + '/', timeout=5).read()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def run_gunicorn(url, ctx, scenarios, iterations, concurrency):
+    headers = {'Authorization': f'Bearer {ctx.token}', 'Content-Type': 'application/json'}
+    results = {}
+    for scenario in scenarios:
+        count = ctx.available(scenario, max(concurrency, int(iterations * scenario.repeat)))
+        if not count:
+            continue
+        jobs = iter(range(count))
+        lock = threading.Lock()
+        latencies, failures = [], []
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(jobs, None)
+                    if i is None:
+                        return
+                    path, body = scenario.make(ctx, i)
+                data = json.dumps(body).encode() if body is not None else None
+                req = urllib.request.Request(url + path, data=data, method=scenario.method, headers=headers)
+                t0 = time.perf_counter()
+                try:
+                    payload = urllib.request.urlopen(req, timeout=60).read()
+                except urllib.error.HTTPError as e:
+                    failures.append(f'{path} returned {e.code}')
+                    continue
+                elapsed = (time.perf_counter() - t0) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if scenario.collect:
+                        getattr(ctx, scenario.collect).append(json.loads(payload)['id'])
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise RuntimeError(f'{scenario.name}: {failures[0]}')
+        results[scenario.name] = _summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def _print(mode, results):
+    print(f'\n{mode}')
+    print(f"  {'endpoint':<24}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL':>6}")
+    for name, r in results.items():
+        print(f"  {name:<24}{r['rps']:>9}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r.get('statements', ''):>6}")
+
+
+def compare(baseline, current, tolerance):
+    """Return a list of human-readable regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for mode, results in baseline['results'].items():
+        for name, base in results.items():
+            now = current['results'].get(mode, {}).get(name)
+            if now is None:
+                continue
+            if now['p50_ms'] > base['p50_ms'] * (1 + tolerance) and now['p50_ms'] - base['p50_ms'] > MIN_REGRESSION_MS:
+                regressions.append(f"{mode} {name}: p50 {base['p50_ms']:.2f} -> {now['p50_ms']:.2f} ms")
+            if 'statements' in base and now.get('statements', 0) > base['statements']:
+                regressions.append(f"{mode} {name}: SQL statements {base['statements']} -> {now['statements']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per endpoint')
+    parser.add_argument('--gunicorn', action='store_true', help='also run over a local gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients against gunicorn')
+    parser.add_argument('--only', nargs='+', help='endpoint names or prefixes to run')
+    parser.add_argument('--archive', action='store_true', help='archive old closed add-on requests first')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed median latency growth (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ.setdefault('DIRECTORY_CACHE_PATH', os.path.join(tmp.name, 'directory.sqlite'))
+    module, app = load_app()
+    summary = populate(module, app, SCALES[args.scale])
+    if args.archive:
+        with app.app_context():
+            summary['archived_requests'] = module.archive_addon_requests(pause=0)[0]
+    print('dataset:', ', '.join(f'{key}={value}' for key, value in summary.items()))
+
+    with app.app_context():
+        user = module.User.query.filter_by(username='admin').first()
+        token = module.create_access_token(identity=user.id)
+    ctx = Context(module, app, token)
+
+    scenarios = READS + WRITES
+    if args.only:
+        scenarios = [s for s in scenarios if any(s.name.startswith(prefix) for prefix in args.only)]
+
+    report = {
+        'scale': args.scale,
+        'dataset': summary,
+        'iterations': args.iterations,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'results': {},
+    }
+    report['results']['test_client'] = run_test_client(module, app, ctx, scenarios, args.iterations)
+    _print('test client (sequential)', report['results']['test_client'])
+
+    if args.gunicorn:
+        ctx.run = 1
+        process, url = _start_gunicorn(args.workers, args.threads)
+        try:
+            report['results']['gunicorn'] = run_gunicorn(url, ctx, scenarios, args.iterations, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait()
+        _print(f'gunicorn ({args.workers} workers x {args.threads} threads, '
+               f'{args.concurrency} clients)', report['results']['gunicorn'])
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nSaved {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print('\nRegressions against', args.compare)
+            for line in regressions:
+                print('  ' + line)
+            sys.exit(1)
+        print('\nNo regressions against', args.compare)
+
+
+if __name__ == '__main__':
+    main()
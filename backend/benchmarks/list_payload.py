@@ -0,0 +1,112 @@
+"""Add-on request list: ``jsonify`` vs. the streaming encoder.
+
+Reports time to first byte, total time and peak Python memory for
+``GET /api/addon-requests`` without a limit, and for the CSV and NDJSON
+exports of the same rows.
+
+    python -m benchmarks.list_payload --requests 20000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks import load_app
+
+TESTS = ['CBC', 'BMP', 'Troponin', 'Lactate', 'PT/INR', 'Magnesium', 'Lipase']
+
+
+def _populate(module, app, n_requests, n_wards=20):
+    rnd = random.Random(n_requests)
+    db = module.db
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        db.session.execute(module.Ward.__table__.insert(), [{'name': f'Ward {i}'} for i in range(n_wards)])
+        for offset in range(0, n_requests, 10000):
+            db.session.execute(module.AddOnRequest.__table__.insert(), [{
+                'ward_id': rnd.randint(1, n_wards),
+                'room_number': str(rnd.randint(100, 140)),
+                'patient_id': f'P{rnd.randint(1000, 99999)}',
+                'requested_test': rnd.choice(TESTS),
+                'reason': rnd.choice(['Missed in morning draw', 'Physician request', 'Clinical change']),
+                'is_urgent': rnd.random() < 0.2,
+                'has_previous_sample': rnd.random() < 0.5,
+                'status': rnd.choice(['pending', 'approved', 'rejected', 'completed']),
+                'requested_by': 1,
+                'created_at': start + timedelta(minutes=i),
+            } for i in range(offset, min(n_requests, offset + 10000))])
+        db.session.commit()
+
+
+def _measure(client, headers, buffered, path='/api/addon-requests'):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path, headers=headers, buffered=buffered)
+    chunks = iter(response.response)
+    first = next(chunks)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ttfb * 1000, total * 1000, peak / 2 ** 20, size
+
+
+def run(n_requests):
+    # DATABASE_URL is read from the environment, so every size gets a fresh process
+    module, app = load_app()
+    _populate(module, app, n_requests)
+    with app.app_context():
+        user = module.User.query.filter_by(username='admin').first()
+        headers = {'Authorization': f'Bearer {module.create_access_token(identity=user.id)}'}
+
+    client = app.test_client()
+    print(f'requests={n_requests:>7}')
+    streamed = _measure(client, headers, buffered=False)
+
+    # The pre-streaming handler: build every dict, then jsonify the list
+    def legacy():
+        query = module.ADDON_REQUEST_LIST.query(module.db.session).order_by(
+            module.AddOnRequest.created_at.desc(), module.AddOnRequest.id.desc())
+        return module.jsonify(module.ADDON_REQUEST_LIST.dump_all(query))
+
+    original = module.json_list_response
+    module.json_list_response = lambda rows, dump=None: legacy()
+    try:
+        buffered = _measure(client, headers, buffered=False)
+    finally:
+        module.json_list_response = original
+
+    exports = [(f'export {fmt}', _measure(client, headers, False, f'/api/addon-requests/export?format={fmt}'))
+               for fmt in ('csv', 'ndjson')]
+
+    for label, (ttfb, total, peak, size) in [('jsonify', buffered), ('streaming', streamed)] + exports:
+        print(f'  {label:<13} first byte {ttfb:8.1f} ms   total {total:8.1f} ms   '
+              f'peak {peak:7.1f} MiB   body {size / 2 ** 20:6.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.requests[0])
+        return
+
+    import subprocess
+    for n_requests in args.requests:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            subprocess.run([sys.executable, '-m', 'benchmarks.list_payload', '--child',
+                            '--requests', str(n_requests)], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
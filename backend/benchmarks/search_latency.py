@@ -0,0 +1,124 @@
+"""Critical call search latency: ``ilike`` table scan vs. the trigram index.
+
+    python -m benchmarks.search_latency --rooms 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import load_app
+
+QUERIES = [
+    ('all', 'jo'), ('all', 'smith'), ('all', 'P4821'), ('room', '12'),
+    ('patient', 'mary'), ('nurse', 'omar'), ('nurse', 'al'), ('all', 'nomatch'),
+]
+
+FIRST_NAMES = ['John', 'Mary', 'Ali', 'Sara', 'Omar', 'Lina', 'Huda', 'Fatima', 'Ahmed', 'Noura']
+LAST_NAMES = ['Smith', 'Jones', 'Hassan', 'Khalid', 'Saleh', 'Brown', 'Nasser', 'Ibrahim']
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _name(rnd):
+    return f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+
+
+def _populate(module, app, n_rooms, rooms_per_ward=40):
+    rnd = random.Random(n_rooms)
+    db = module.db
+    with app.app_context():
+        n_wards = max(1, n_rooms // rooms_per_ward)
+        db.session.execute(module.Ward.__table__.insert(), [
+            {'name': f'Ward {i}'} for i in range(n_wards)
+        ])
+        db.session.execute(module.Room.__table__.insert(), [{
+            'ward_id': i % n_wards + 1,
+            'room_number': str(100 + i % rooms_per_ward),
+            'patient_name': _name(rnd) if rnd.random() < 0.9 else None,
+            'patient_id': f'P{rnd.randint(1000, 99999)}',
+            'primary_nurse_name': _name(rnd),
+            'primary_nurse_extension': str(rnd.randint(1000, 9999)),
+            'backup_nurse_name': _name(rnd) if rnd.random() < 0.5 else None,
+            'shift_type': 'day',
+        } for i in range(n_rooms)])
+        db.session.commit()
+
+
+def _legacy_search(module, q, search_type):
+    Room, Ward = module.Room, module.Ward
+    like = f'%{q}%'
+    query = Room.query
+    if search_type == 'ward':
+        query = query.join(Ward).filter(Ward.name.ilike(like))
+    elif search_type == 'room':
+        query = query.filter(Room.room_number.ilike(like))
+    elif search_type == 'patient':
+        query = query.filter(Room.patient_id.ilike(like) | Room.patient_name.ilike(like))
+    elif search_type == 'nurse':
+        query = query.filter(Room.primary_nurse_name.ilike(like) | Room.backup_nurse_name.ilike(like))
+    else:
+        query = query.filter(
+            Room.room_number.ilike(like) | Room.patient_id.ilike(like) | Room.patient_name.ilike(like) |
+            Room.primary_nurse_name.ilike(like) | Room.backup_nurse_name.ilike(like)
+        )
+    return [r.ward.name for r in query.limit(50).all()]
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(n_rooms, repeat):
+    # The search index is per process, so every size gets a fresh process
+    module, app = load_app()
+    _populate(module, app, n_rooms)
+    with app.app_context():
+        start = time.perf_counter()
+        module.refresh_search_index(force=True)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        legacy, indexed = [], []
+        for search_type, q in QUERIES:
+            legacy += _time(lambda: _legacy_search(module, q, search_type), repeat)
+            indexed += _time(lambda: module.room_search_index.search(q, search_type), repeat)
+
+    print(f'rooms={n_rooms:>7}  index build {build_ms:8.1f} ms')
+    for label, samples in (('ilike scan', legacy), ('trigram index', indexed)):
+        print(f'  {label:<14} p50 {statistics.median(samples):8.3f} ms   '
+              f'p95 {_percentile(samples, 95):8.3f} ms   max {max(samples):8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.rooms[0], args.repeat)
+        return
+
+    import subprocess
+    for n_rooms in args.rooms:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            subprocess.run([sys.executable, '-m', 'benchmarks.search_latency', '--child',
+                            '--rooms', str(n_rooms), '--repeat', str(args.repeat)],
+                           env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Worker startup: cold import, app construction and first-request latency.
+
+Each run is a fresh interpreter, as a new gunicorn worker would be. The
+``bootstrap`` mode also runs the schema/seed step in the worker, which is
+what every worker did before the application factory; ``factory`` is
+the current worker boot. With ``--gunicorn`` it also times a gunicorn
+start to the first answered request, with and without ``--preload``.
+
+    python -m benchmarks.startup --runs 10 --gunicorn
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks import load_app
+from benchmarks.dataset import SCALES, populate
+
+STEPS = ('import', 'create_app', 'bootstrap', 'first_request', 'second_request')
+
+
+def child(mode):
+    start = time.perf_counter()
+    import app as module
+    timings = {'import': time.perf_counter() - start}
+
+    start = time.perf_counter()
+    app = module.create_app()
+    timings['create_app'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode == 'bootstrap':
+        with app.app_context():
+            module.bootstrap()
+    timings['bootstrap'] = time.perf_counter() - start
+
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {module.create_access_token(identity=1)}'}
+    client = app.test_client()
+    for step in ('first_request', 'second_request'):
+        start = time.perf_counter()
+        response = client.get('/api/wards', headers=headers)
+        timings[step] = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+    print(json.dumps(timings))
+
+
+def _spawn(mode):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', mode],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _gunicorn_boot(workers, preload):
+    """Seconds from launching gunicorn to the first answered request."""
+    port = _free_port()
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+               '--log-level', 'warning', 'app:create_app()']
+    if preload:
+        command.insert(3, '--preload')
+    start = time.perf_counter()
+    process = subprocess.Popen(command)
+    try:
+        while time.perf_counter() - start < 60:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5).read()
+                return time.perf_counter() - start
+            except (urllib.error.URLError, OSError):
+                if process.poll() is not None:
+                    raise RuntimeError('gunicorn exited during startup')
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not start')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--child', choices=('factory', 'bootstrap'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ.setdefault('DIRECTORY_CACHE_PATH', os.path.join(tmp.name, 'directory.sqlite'))
+    module, app = load_app()
+    populate(module, app, SCALES[args.scale])
+
+    print(f'{"median ms":<12}' + ''.join(f'{step:>16}' for step in STEPS) + f'{"total":>12}')
+    for mode in ('bootstrap', 'factory'):
+        runs = [_spawn(mode) for _ in range(args.runs)]
+        medians = [statistics.median(run[step] for run in runs) * 1000 for step in STEPS]
+        total = statistics.median(sum(run.values()) for run in runs) * 1000
+        print(f'{mode:<12}' + ''.join(f'{value:16.1f}' for value in medians) + f'{total:12.1f}')
+
+    if args.gunicorn:
+        for preload in (False, True):
+            boots = [_gunicorn_boot(args.workers, preload) for _ in range(args.runs)]
+            label = 'with --preload' if preload else 'without --preload'
+            print(f'gunicorn -w {args.workers} {label:<18} first response after '
+                  f'{statistics.median(boots) * 1000:8.1f} ms (median of {args.runs})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Add-on request write throughput: transaction per request vs. group commit.
+
+    python -m benchmarks.write_throughput --threads 1 8 32 --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import load_app
+from benchmarks.search_latency import _percentile
+
+
+def _setup(module, app):
+    db = module.db
+    with app.app_context():
+        ward = module.Ward(name='Bench Ward')
+        db.session.add(ward)
+        db.session.commit()
+        user = module.User.query.filter_by(username='admin').first()
+        token = module.create_access_token(identity=user.id)
+        return ward.id, token
+
+
+def run(n_threads, n_requests):
+    # ADDON_GROUP_COMMIT and DATABASE_URL come from the environment of this process
+    module, app = load_app()
+    ward_id, token = _setup(module, app)
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        own = []
+        for i in range(n_requests):
+            start = time.perf_counter()
+            response = client.post('/api/addon-requests', headers=headers, json={
+                'ward_id': ward_id,
+                'room_number': str(100 + i % 40),
+                'patient_id': f'P{index}-{i}',
+                'requested_test': 'CBC',
+                'reason': 'Benchmark',
+            })
+            own.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 201:
+                with lock:
+                    errors.append(response.status_code)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    mode = 'group commit' if app.config['ADDON_GROUP_COMMIT'] else 'per request'
+    print(f'  {mode:<12} threads={n_threads:<3} {len(latencies) / elapsed:8.1f} writes/s   '
+          f'p50 {statistics.median(latencies):7.2f} ms   p95 {_percentile(latencies, 95):7.2f} ms'
+          + (f'   errors {len(errors)}' if errors else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.threads[0], args.requests)
+        return
+
+    import subprocess
+    for n_threads in args.threads:
+        for group_commit in ('0', '1'):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, ADDON_GROUP_COMMIT=group_commit,
+                           DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+                subprocess.run([sys.executable, '-m', 'benchmarks.write_throughput', '--child',
+                                '--threads', str(n_threads), '--requests', str(args.requests)],
+                               env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
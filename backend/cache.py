@@ -0,0 +1,151 @@
+"""Small caches.
+
+``TTLCache`` is an LRU-bounded map whose entries expire after ``ttl``
+seconds. Each worker keeps its own, so the TTL bounds how stale a change
+made by another worker can be; callers invalidate entries they change
+themselves.
+
+``SQLiteCache`` keeps bytes in a SQLite file that every worker on the
+host opens, so a value built by one worker is reused by the others. It
+has no expiry: callers put a version in the key. The file holds patient
+data, so it is created readable by its owner only, and a file owned by
+another user (who could read it or plant bodies the API would serve) is
+refused.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    def __init__(self, ttl=300, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        """Return the cached entry for ``key``, calling ``load(key)`` on a miss.
+
+        ``None`` results are not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = load(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """LRU-bounded ``str -> bytes`` map in a SQLite file shared between processes.
+
+    Disabled (every ``get`` calls ``load``) while ``path`` is None. Errors
+    from the file are logged and treated as misses, so a broken cache
+    only costs speed.
+    """
+
+    def __init__(self, path=None, maxsize=1024, touch_interval=5.0):
+        self.path = path
+        self.maxsize = maxsize
+        # Recency is updated at most this often per entry, so hits on a
+        # hot entry do not each take the file's write lock
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid() or local.path != self.path:
+            self._check_file()
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS entry '
+                               '(key TEXT PRIMARY KEY, value BLOB NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_entry_accessed ON entry (accessed)')
+            local.connection, local.pid, local.path = connection, os.getpid(), self.path
+        return local.connection
+
+    def _check_file(self):
+        """Create the file owner-only, or refuse (and disable the cache)
+        when it is a symlink or belongs to another user."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+            # SQLite gives the -wal and -shm files the database file's permissions
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+            try:
+                if hasattr(os, 'getuid'):
+                    if os.fstat(fd).st_uid != os.getuid():
+                        raise PermissionError(f'not owned by uid {os.getuid()}')
+                    os.fchmod(fd, 0o600)
+            finally:
+                os.close(fd)
+        except OSError as exc:
+            path, self.path = self.path, None
+            raise sqlite3.OperationalError(f'Refusing shared cache file {path}: {exc}') from exc
+
+    def get(self, key, load):
+        """Return the stored bytes for ``key``, calling ``load(key)`` on a miss."""
+        if self.path is None:
+            return load(key)
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT value, accessed FROM entry WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                now = time.time()
+                if now - row[1] > self.touch_interval:
+                    connection.execute('UPDATE entry SET accessed = ? WHERE key = ?', (now, key))
+                return row[0]
+        except sqlite3.Error:
+            logger.exception('Shared cache read failed (%s)', self.path)
+            return load(key)
+        self.misses += 1
+        value = load(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        if self.path is None:
+            return
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO entry (key, value, accessed) VALUES (?, ?, ?)',
+                               (key, value, time.time()))
+            connection.execute('DELETE FROM entry WHERE key IN '
+                               '(SELECT key FROM entry ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                               (self.maxsize,))
+        except sqlite3.Error:
+            logger.exception('Shared cache write failed (%s)', self.path)
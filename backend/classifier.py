@@ -0,0 +1,69 @@
+"""Add-on request reason classification.
+
+Each request's free-text reason is classified once, when the request is
+created. The result is a normalized category and a preventable flag,
+stored on the row so analytics group and count columns instead of
+scanning text. ``ReasonClassifier`` compiles every rule keyword into
+one regular expression; any object with a ``classify(reason)`` method
+returning ``(category, preventable)`` can replace it.
+"""
+import json
+import re
+from functools import lru_cache
+
+# (category, preventable, keywords). The first rule with a keyword
+# matching the start of a word in the reason wins; no match is 'Other'.
+DEFAULT_RULES = [
+    ('Missed order', True, ['missing', 'forgot']),
+    ('Sample issue', False, ['hemoly', 'clotted', 'insufficient', 'mislabel', 'lost sample', 'leaked']),
+    ('Clinical change', False, ['clinical change', 'deteriorat', 'abnormal', 'follow-up', 'follow up',
+                                'worsening', 'new symptom']),
+    ('Physician request', False, ['physician', 'consultant', 'doctor', 'rounds', 'team request']),
+    ('Admission workup', False, ['admission', 'admit', 'workup', 'work-up']),
+    ('Pre-procedure', False, ['procedure', 'pre-op', 'preop', 'surgery', 'operation']),
+]
+DEFAULT_CATEGORY = 'Other'
+
+
+def rules_from_config(config):
+    """Rules from ``ADDON_REASON_RULES`` (a JSON list of objects with
+    ``category``, ``preventable`` and ``keywords``), else the defaults."""
+    raw = config.get('ADDON_REASON_RULES')
+    if not raw:
+        return DEFAULT_RULES
+    return [(rule['category'], bool(rule.get('preventable', False)), list(rule['keywords']))
+            for rule in json.loads(raw)]
+
+
+class ReasonClassifier:
+    def __init__(self, rules=DEFAULT_RULES, default_category=DEFAULT_CATEGORY, cache_size=4096):
+        self.default_category = default_category
+        self.cache_size = cache_size
+        self.set_rules(rules)
+
+    def init_app(self, app):
+        self.set_rules(rules_from_config(app.config))
+
+    def set_rules(self, rules):
+        self.rules = [(category, preventable) for category, preventable, _ in rules]
+        alternatives = []
+        for index, (_, _, keywords) in enumerate(rules):
+            words = '|'.join(re.escape(keyword.lower()) for keyword in sorted(keywords, key=len, reverse=True))
+            alternatives.append(f'(?P<r{index}>\\b(?:{words}))')
+        self._pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        # Reasons repeat a lot; a fresh cache per rule set
+        self.classify = lru_cache(maxsize=self.cache_size)(self._classify)
+
+    def _classify(self, reason):
+        """``(category, preventable)`` for one reason text."""
+        best = None
+        if reason and self._pattern is not None:
+            for match in self._pattern.finditer(reason):
+                index = int(match.lastgroup[1:])
+                if best is None or index < best:
+                    best = index
+                    if index == 0:
+                        break
+        if best is None:
+            return self.default_category, False
+        return self.rules[best]
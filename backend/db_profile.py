@@ -0,0 +1,117 @@
+"""Database connection profile: SQLite pragmas, pool sizing and read routing.
+
+``engine_options`` and ``read_bind`` build the Flask-SQLAlchemy engine
+configuration for one worker; ``apply_profile`` then installs the
+per-connection pragmas. With ``DATABASE_PROFILE=wal`` (the default) every
+SQLite connection runs in WAL mode, so readers never wait for the writer
+and writers wait up to the busy timeout instead of failing with
+"database is locked". ``stock`` leaves the driver defaults alone.
+
+Views decorated with ``read_only`` run their queries on the ``read``
+bind when ``DATABASE_READ_POOL_SIZE`` is set: a separate pool whose
+connections are ``query_only``, so long reads never hold a connection
+a writer is waiting for.
+"""
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_BIND = 'read'
+
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def _is_memory(uri):
+    return _is_sqlite(uri) and make_url(uri).database in (None, '', ':memory:')
+
+
+def sqlite_pragmas(config):
+    """PRAGMA name -> value run on every new connection (empty for ``stock``)."""
+    if config['DATABASE_PROFILE'] == 'stock':
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': config['DATABASE_BUSY_TIMEOUT_MS'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        # Negative means KiB rather than pages
+        'cache_size': -config['SQLITE_CACHE_SIZE_KB'],
+    }
+
+
+def default_pool_size(config):
+    """Connections one worker can use at once: its request threads plus
+    the notification, change feed, shift scheduler and group commit threads."""
+    return config['WORKER_THREADS'] + config['NOTIFICATION_WORKERS'] + 3
+
+
+def engine_options(config):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the primary database."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if _is_memory(uri):
+        # One shared connection (StaticPool); pool options do not apply
+        return {}
+    options = {
+        'pool_size': config['DATABASE_POOL_SIZE'] or default_pool_size(config),
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+    }
+    if _is_sqlite(uri) and config['DATABASE_PROFILE'] != 'stock':
+        # busy_timeout replaces the driver's own 5 s lock wait
+        options['connect_args'] = {'timeout': config['DATABASE_BUSY_TIMEOUT_MS'] / 1000}
+    return options
+
+
+def read_bind(config):
+    """Engine config for the ``read`` bind, or None when read routing is off."""
+    size = config['DATABASE_READ_POOL_SIZE']
+    uri = config['DATABASE_READ_URL'] or config['SQLALCHEMY_DATABASE_URI']
+    if not size or _is_memory(uri):
+        return None
+    return dict(engine_options(dict(config, SQLALCHEMY_DATABASE_URI=uri)), url=uri, pool_size=size)
+
+
+def apply_profile(engine, config, read_only=False):
+    """Run the profile's pragmas on each new connection of ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+    if _is_memory(str(engine.url)):
+        pragmas.pop('journal_mode', None)
+    if read_only:
+        pragmas['query_only'] = 1
+    if not pragmas:
+        return
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def read_only(view):
+    """Send the view's queries to the ``read`` bind when it is configured."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_app_context() and g.get('db_read_only')):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,92 @@
+"""Change feed for add-on request events.
+
+The database is the broker: every worker runs one poller thread that
+reads new ``add_on_log`` rows and keeps the most recent ones in a ring
+buffer. Any number of subscribers in that worker wait on a condition
+variable and read from the buffer, so the query cost does not grow with
+the number of open dashboards.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    def __init__(self, fetch, latest_id, interval=1.0, backlog=1000, batch_size=500):
+        """``fetch(after_id, limit)`` returns events (dicts with an increasing
+        ``id``) newer than ``after_id``; ``latest_id()`` returns the newest id.
+        """
+        self.app = None
+        self._fetch = fetch
+        self._latest_id = latest_id
+        self.interval = interval
+        self.batch_size = batch_size
+        self._events = deque(maxlen=backlog)
+        self._cond = threading.Condition()
+        self._thread = None
+        self.last_id = None
+
+    def init_app(self, app):
+        """``fetch`` and ``latest_id`` run inside ``app``'s context."""
+        self.app = app
+        self.interval = app.config.get('CHANGE_FEED_POLL_SECONDS', self.interval)
+
+    def _query(self, fn, *args):
+        # Callers include response generators running after the request
+        # context is gone, so every query gets its own app context
+        with self.app.app_context():
+            return fn(*args)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.last_id is None:
+                self.last_id = self._query(self._latest_id) or 0
+            self._thread = threading.Thread(target=self._run, name='addon-change-feed', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                # Keep the feed alive across transient database errors
+                logger.exception('Change feed poll failed')
+            time.sleep(self.interval)
+
+    def poll(self):
+        events = self._query(self._fetch, self.last_id, self.batch_size)
+        while events:
+            with self._cond:
+                self._events.extend(events)
+                self.last_id = events[-1]['id']
+                self._cond.notify_all()
+            if len(events) < self.batch_size:
+                break
+            events = self._query(self._fetch, self.last_id, self.batch_size)
+
+    def read(self, since, timeout):
+        """Return ``(events, cursor)`` for events after ``since``.
+
+        Blocks up to ``timeout`` seconds when nothing newer is buffered.
+        Subscribers that fell behind the ring buffer are served straight
+        from the database.
+        """
+        self.start()
+        with self._cond:
+            if since is None:
+                since = self.last_id
+            lagging = since < self.last_id and (
+                not self._events or since < self._events[0]['id'] - 1)
+        if lagging:
+            missed = self._query(self._fetch, since, self.batch_size)
+            return missed, missed[-1]['id'] if missed else since
+        with self._cond:
+            if since >= self.last_id:
+                self._cond.wait_for(lambda: self.last_id > since, timeout)
+            events = [event for event in self._events if event['id'] > since]
+            return events, events[-1]['id'] if events else since
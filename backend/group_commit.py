@@ -0,0 +1,107 @@
+"""Group commit for add-on writes.
+
+Request threads hand their unit of work to a single committer thread,
+which runs everything that arrived within a short window in one
+transaction and commits once. Under SQLite that turns N fsyncs and N
+writer-lock acquisitions into one. Units must only touch ``db.session``
+and return plain data, since they run in the committer's session.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitter:
+    def __init__(self, db, max_batch=64, max_wait=0.005, timeout=30.0):
+        self.app = None
+        self.db = db
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_batch = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.max_batch = app.config.get('GROUP_COMMIT_MAX_BATCH', self.max_batch)
+        self.max_wait = app.config.get('GROUP_COMMIT_MAX_WAIT_MS', self.max_wait * 1000) / 1000
+        self.timeout = app.config.get('GROUP_COMMIT_TIMEOUT', self.timeout)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` in the next group transaction and return its result.
+
+        Raises ``concurrent.futures.TimeoutError`` if that takes longer than
+        ``timeout`` seconds; the unit may still commit afterwards.
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future.result(self.timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        # Only hold the batch open when the last one was shared; a lone
+        # writer should not pay max_wait on every request
+        wait = self.max_wait if self._last_batch > 1 else 0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._last_batch = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with self.app.app_context():
+                    self._commit_batch(batch)
+            except Exception as error:
+                # A rollback or the session teardown failed. Fail every
+                # request still waiting on this batch and keep serving.
+                logger.exception('Group commit failed')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def _commit_batch(self, batch):
+        session = self.db.session
+        results = []
+        try:
+            for fn, args, future in batch:
+                results.append((future, fn(*args)))
+            session.commit()
+        except Exception as error:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0][2].set_exception(error)
+                return
+            failed = True
+        else:
+            failed = False
+        if failed:
+            # One unit failed: fall back to a transaction per unit so only
+            # the failing request sees the error
+            for item in batch:
+                self._commit_batch([item])
+            return
+        for future, result in results:
+            future.set_result(result)
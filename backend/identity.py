@@ -0,0 +1,59 @@
+"""Password hashing off the request thread.
+
+``PasswordPool`` runs PBKDF2/scrypt hashing on a fixed number of threads
+(hashlib releases the GIL while hashing). It admits at most
+``max_pending`` calls at once, running or queued, and gives up on a call
+after ``timeout`` seconds. Keeping ``max_pending`` below the number of
+request threads means a login storm is answered with 503s while other
+endpoints still have threads to run on.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password pool already holds ``max_pending`` calls, or
+    a call did not finish within ``timeout`` seconds."""
+
+
+class PasswordPool:
+    def __init__(self, workers=4, max_pending=4, timeout=10.0):
+        self.timeout = timeout
+        self._resize(workers, max_pending)
+
+    def init_app(self, app):
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._resize(app.config.get('PASSWORD_HASH_WORKERS', self.workers),
+                     app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending))
+
+    def _resize(self, workers, max_pending):
+        # ThreadPoolExecutor starts its threads on first submit, so nothing
+        # runs until a worker process hashes its first password
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even after a timeout
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordPoolBusy() from None
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password)
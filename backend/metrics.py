@@ -0,0 +1,241 @@
+"""Per-request instrumentation exposed in Prometheus text format.
+
+``Instrumentation.init_app`` hooks the Flask request lifecycle, the
+SQLAlchemy engine and the app's JSON provider. Each request records its
+latency, the number and total duration of SQL statements it ran, rows
+serialized and time spent encoding JSON. Aggregates live in fixed-bucket
+histograms per worker process, so the cost per request is a few
+``perf_counter`` calls and one lock acquisition.
+
+Requests slower than ``slow_ms`` are logged with the SQL they ran
+(statement text and duration only; parameters can hold patient data and
+are never logged).
+"""
+import bisect
+import logging
+import threading
+import time
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# Statements kept per request for the slow-request log
+MAX_CAPTURED_STATEMENTS = 50
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'status', 'queries', 'query_time', 'rows', 'serialize_time', 'statements')
+
+    def __init__(self, capture):
+        self.start = time.perf_counter()
+        self.status = 500
+        self.queries = 0
+        self.query_time = 0.0
+        self.rows = 0
+        self.serialize_time = 0.0
+        self.statements = [] if capture else None
+
+
+def current():
+    """Metrics of the request being handled on this thread, or None."""
+    return getattr(_local, 'request', None)
+
+
+def record_serialization(seconds, rows=0):
+    metrics = current()
+    if metrics is not None:
+        metrics.serialize_time += seconds
+        metrics.rows += rows
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class InstrumentedJSONProvider(DefaultJSONProvider):
+    """``jsonify`` with its encoding time (and list length as rows) charged
+    to the current request."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record_serialization(time.perf_counter() - start, len(obj) if isinstance(obj, list) else 0)
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Instrumentation:
+    def __init__(self, prefix='ward_lab', slow_ms=0, skip_endpoints=()):
+        self.prefix = prefix
+        self.slow_ms = slow_ms
+        self.skip_endpoints = set(skip_endpoints)
+        self._lock = threading.Lock()
+        self._requests = {}     # (endpoint, method, status) -> count
+        self._latency = {}      # (endpoint, method) -> Histogram
+        self._db_time = {}      # endpoint -> Histogram of SQL seconds per request
+        self._db_queries = {}   # endpoint -> Histogram of statements per request
+        self._serialize = {}    # endpoint -> Histogram of JSON encoding seconds
+        self._rows = {}         # endpoint -> rows serialized
+        self._background = [0, 0.0]  # statements and seconds outside requests
+        # name -> object with ``hits`` and ``misses`` counters
+        self.caches = {}
+
+    def init_app(self, app):
+        self.slow_ms = app.config.get('SLOW_REQUEST_MS', self.slow_ms)
+        app.json = InstrumentedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Engine events are global; register them once per process
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # Flask hooks
+    def _before_request(self):
+        if request.endpoint in self.skip_endpoints:
+            _local.request = None
+        else:
+            _local.request = RequestMetrics(capture=self.slow_ms > 0)
+
+    def _after_request(self, response):
+        metrics = current()
+        if metrics is not None:
+            metrics.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        # Runs after a streamed body has been fully written, so streaming
+        # time counts toward latency and serialization
+        metrics = current()
+        if metrics is None:
+            return
+        _local.request = None
+        elapsed = time.perf_counter() - metrics.start
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        with self._lock:
+            key = (endpoint, method, metrics.status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._histogram(self._latency, (endpoint, method), LATENCY_BUCKETS).observe(elapsed)
+            self._histogram(self._db_time, endpoint, LATENCY_BUCKETS).observe(metrics.query_time)
+            self._histogram(self._db_queries, endpoint, COUNT_BUCKETS).observe(metrics.queries)
+            self._histogram(self._serialize, endpoint, LATENCY_BUCKETS).observe(metrics.serialize_time)
+            self._rows[endpoint] = self._rows.get(endpoint, 0) + metrics.rows
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            self._log_slow(endpoint, method, elapsed, metrics)
+
+    @staticmethod
+    def _histogram(table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+    # SQLAlchemy engine events
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        metrics = current()
+        if metrics is None:
+            with self._lock:
+                self._background[0] += 1
+                self._background[1] += elapsed
+            return
+        metrics.queries += 1
+        metrics.query_time += elapsed
+        if metrics.statements is not None and len(metrics.statements) < MAX_CAPTURED_STATEMENTS:
+            metrics.statements.append((elapsed, statement))
+
+    def _log_slow(self, endpoint, method, elapsed, metrics):
+        lines = [
+            f'Slow request {method} {request.full_path.rstrip("?")} ({endpoint}) -> {metrics.status}: '
+            f'{elapsed * 1000:.1f} ms total, {metrics.queries} SQL statements in '
+            f'{metrics.query_time * 1000:.1f} ms, JSON {metrics.serialize_time * 1000:.1f} ms, '
+            f'{metrics.rows} rows'
+        ]
+        for seconds, statement in metrics.statements:
+            lines.append(f'  {seconds * 1000:8.2f} ms  {" ".join(statement.split())[:500]}')
+        if metrics.queries > len(metrics.statements):
+            lines.append(f'  ... {metrics.queries - len(metrics.statements)} more statements')
+        logger.warning('\n'.join(lines))
+
+    # Exposition
+    def render(self):
+        """Current aggregates in the Prometheus text exposition format."""
+        p = self.prefix
+        out = []
+        with self._lock:
+            out += [f'# HELP {p}_http_requests_total Requests handled, by endpoint, method and status.',
+                    f'# TYPE {p}_http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                out.append(f'{p}_http_requests_total{{{_labels(("endpoint", "method", "status"), (endpoint, method, status))}}} {count}')
+            self._render_histograms(out, f'{p}_http_request_duration_seconds',
+                                    'Request latency, including streaming the body.',
+                                    ('endpoint', 'method'), self._latency)
+            self._render_histograms(out, f'{p}_request_db_seconds',
+                                    'Time spent executing SQL per request.', ('endpoint',), self._db_time)
+            self._render_histograms(out, f'{p}_request_db_queries',
+                                    'SQL statements executed per request.', ('endpoint',), self._db_queries)
+            self._render_histograms(out, f'{p}_request_serialize_seconds',
+                                    'Time spent encoding JSON per request.', ('endpoint',), self._serialize)
+            out += [f'# HELP {p}_response_rows_total Rows serialized into responses.',
+                    f'# TYPE {p}_response_rows_total counter']
+            for endpoint, rows in sorted(self._rows.items()):
+                out.append(f'{p}_response_rows_total{{endpoint="{endpoint}"}} {rows}')
+            out += [f'# HELP {p}_background_db_queries_total SQL statements run outside requests.',
+                    f'# TYPE {p}_background_db_queries_total counter',
+                    f'{p}_background_db_queries_total {self._background[0]}',
+                    f'# HELP {p}_background_db_seconds_total Time spent in SQL outside requests.',
+                    f'# TYPE {p}_background_db_seconds_total counter',
+                    f'{p}_background_db_seconds_total {_format(self._background[1])}']
+        out += [f'# HELP {p}_cache_lookups_total Cache lookups in this process, by cache and result.',
+                f'# TYPE {p}_cache_lookups_total counter']
+        for name, cache in sorted(self.caches.items()):
+            out.append(f'{p}_cache_lookups_total{{cache="{name}",result="hit"}} {cache.hits}')
+            out.append(f'{p}_cache_lookups_total{{cache="{name}",result="miss"}} {cache.misses}')
+        return '\n'.join(out) + '\n'
+
+    @staticmethod
+    def _render_histograms(out, name, help_text, label_names, table):
+        out += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key, histogram in sorted(table.items()):
+            values = key if isinstance(key, tuple) else (key,)
+            labels = _labels(label_names, values)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            out.append(f'{name}_sum{{{labels}}} {_format(histogram.sum)}')
+            out.append(f'{name}_count{{{labels}}} {histogram.count}')
@@ -0,0 +1,195 @@
+"""Schema migrations for databases that already exist.
+
+``db.create_all()`` creates missing tables but never alters existing ones,
+so index and column changes to live databases are shipped here as
+ordered, idempotent steps. Applied ids are recorded in the
+``schema_migration`` table.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import DateTime, bindparam, column, inspect, select, table, text
+
+MIGRATIONS = []
+
+
+def migration(migration_id, description):
+    def register(fn):
+        MIGRATIONS.append((migration_id, description, fn))
+        return fn
+    return register
+
+
+def create_indexes(connection, *indexes):
+    """``indexes`` are ``(name, table_name, columns)`` tuples."""
+    for name, table_name, columns in indexes:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table_name} ({', '.join(columns)})"))
+
+
+def add_column(connection, table_name, name, ddl):
+    """Add a column unless it already exists (``ddl`` is the type and constraints)."""
+    if name not in {existing['name'] for existing in inspect(connection).get_columns(table_name)}:
+        connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {name} {ddl}'))
+
+
+@migration('0001_hot_path_indexes', 'Indexes for add-on, room and audit log hot paths')
+def hot_path_indexes(connection):
+    create_indexes(
+        connection,
+        ('ix_add_on_request_status_created', 'add_on_request', ('status', 'created_at')),
+        ('ix_add_on_request_ward_status_created', 'add_on_request', ('ward_id', 'status', 'created_at')),
+        ('ix_add_on_request_created', 'add_on_request', ('created_at',)),
+        ('ix_room_ward', 'room', ('ward_id',)),
+        ('ix_add_on_log_request_timestamp', 'add_on_log', ('request_id', 'timestamp')),
+    )
+
+
+@migration('0002_completed_at_index', 'Index add_on_request.completed_at for the dashboard summary')
+def completed_at_index(connection):
+    create_indexes(connection, ('ix_add_on_request_completed', 'add_on_request', ('completed_at',)))
+
+
+@migration('0003_directory_version', 'Seed the directory_version row')
+def directory_version_row(connection):
+    connection.execute(text(
+        'INSERT INTO directory_version (id, version, updated_at) '
+        'SELECT 1, 1, :now WHERE NOT EXISTS (SELECT 1 FROM directory_version WHERE id = 1)'
+    ), {'now': datetime.utcnow()})
+
+
+@migration('0004_reason_classification', 'Reason category and preventable columns on add-on requests')
+def reason_classification(connection):
+    # Values are filled in by reclassify_addon_reasons() once the schema is up
+    for table_name in ('add_on_request', 'add_on_request_archive'):
+        add_column(connection, table_name, 'reason_category', 'VARCHAR(50)')
+        add_column(connection, table_name, 'preventable', 'BOOLEAN')
+    create_indexes(
+        connection,
+        ('ix_add_on_request_category_created', 'add_on_request', ('reason_category', 'created_at')),
+        ('ix_add_on_request_archive_category_created', 'add_on_request_archive', ('reason_category', 'created_at')),
+    )
+
+
+@migration('0005_log_timestamp_indexes', 'Index add-on audit log timestamps for date-range exports')
+def log_timestamp_indexes(connection):
+    create_indexes(
+        connection,
+        ('ix_add_on_log_timestamp', 'add_on_log', ('timestamp',)),
+        ('ix_add_on_log_archive_timestamp', 'add_on_log_archive', ('timestamp',)),
+    )
+
+
+@migration('0006_turnaround_durations', 'Review and completion durations on add-on requests')
+def turnaround_durations(connection):
+    for name in ('add_on_request', 'add_on_request_archive'):
+        add_column(connection, name, 'review_seconds', 'INTEGER')
+        add_column(connection, name, 'complete_seconds', 'INTEGER')
+        # Unlike reason classification the durations depend only on the
+        # row itself, so existing requests are filled in here
+        _fill_durations(connection, name)
+
+
+def _fill_durations(connection, name, batch_size=1000):
+    rows = table(name, column('id'), column('created_at', DateTime()), column('reviewed_at', DateTime()),
+                 column('completed_at', DateTime()), column('review_seconds'), column('complete_seconds'))
+    update = rows.update().where(rows.c.id == bindparam('row_id')).values(
+        review_seconds=bindparam('review'), complete_seconds=bindparam('complete'))
+    after = 0
+    while True:
+        batch = connection.execute(
+            select(rows.c.id, rows.c.created_at, rows.c.reviewed_at, rows.c.completed_at)
+            .where(rows.c.id > after, (rows.c.reviewed_at.is_not(None) & rows.c.review_seconds.is_(None))
+                   | (rows.c.completed_at.is_not(None) & rows.c.complete_seconds.is_(None)))
+            .order_by(rows.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        connection.execute(update, [{
+            'row_id': row.id,
+            'review': int((row.reviewed_at - row.created_at).total_seconds()) if row.reviewed_at else None,
+            'complete': int((row.completed_at - row.created_at).total_seconds()) if row.completed_at else None,
+        } for row in batch])
+        after = batch[-1].id
+
+
+@migration('0007_rollup_key_without_requester', 'Drop requested_by from the add-on rollup key')
+def rollup_key_without_requester(connection):
+    # The key is in a unique constraint, so the tables are dropped;
+    # upgrade_schema() recreates them and rebuilds the counts
+    for table_name in ('add_on_rollup_hourly', 'add_on_rollup_daily'):
+        connection.execute(text(f'DROP TABLE IF EXISTS {table_name}'))
+
+
+def _ensure_table(connection):
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migration ('
+        'id VARCHAR(100) PRIMARY KEY, description VARCHAR(255), applied_at TIMESTAMP)'
+    ))
+
+
+def applied_migrations(engine):
+    with engine.begin() as connection:
+        _ensure_table(connection)
+        return {row[0] for row in connection.execute(text('SELECT id FROM schema_migration'))}
+
+
+def pending_migrations(engine):
+    applied = applied_migrations(engine)
+    return [(mid, description) for mid, description, _ in MIGRATIONS if mid not in applied]
+
+
+def apply_migrations(engine, app=None):
+    """Apply pending migrations in order, each in its own transaction.
+
+    Safe to run from several processes at once: every step is idempotent
+    and a step already recorded by another process is skipped.
+    Returns the ids applied by this call.
+    """
+    applied = []
+    for migration_id, description, fn in MIGRATIONS:
+        with engine.begin() as connection:
+            _ensure_table(connection)
+            done = connection.execute(
+                text('SELECT 1 FROM schema_migration WHERE id = :id'), {'id': migration_id}
+            ).first()
+            if done:
+                continue
+            fn(connection)
+            connection.execute(
+                text('INSERT INTO schema_migration (id, description, applied_at) VALUES (:id, :description, :at)'),
+                {'id': migration_id, 'description': description, 'at': datetime.utcnow()}
+            )
+        applied.append(migration_id)
+        if app is not None:
+            app.logger.info('Applied migration %s', migration_id)
+    return applied
+
+
+_FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)')
+# Subqueries the planner runs as co-routines or materializes; reading
+# their output is a SCAN too, but of rows their own plan lines produced
+_SUBQUERY = re.compile(r'\b(?:CO-ROUTINE|MATERIALIZE) (\w+)')
+
+
+def full_table_scans(connection, statement):
+    """Tables the SQLite planner reads with a full scan for ``statement``.
+
+    Index scans (``SCAN t USING INDEX``) and scans of a subquery's output
+    are not reported; the subquery's own plan lines are. Returns None
+    on other databases, where EXPLAIN output is not comparable.
+    """
+    if connection.dialect.name != 'sqlite':
+        return None
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    plan = connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    subqueries = set()
+    for row in plan:
+        match = _SUBQUERY.search(row[-1])
+        if match:
+            subqueries.add(match.group(1))
+    scans = []
+    for row in plan:
+        match = _FULL_SCAN.search(row[-1])
+        if match and match.group(1) not in subqueries:
+            scans.append(match.group(1))
+    return scans
@@ -0,0 +1,169 @@
+"""Outbox-backed notification delivery.
+
+Request handlers only insert outbox rows, in the same transaction as
+the change they announce. ``NotificationDispatcher`` threads claim
+pending rows, batch them per recipient, hand them to a provider and
+retry failures with exponential backoff, so SMS/email latency never
+reaches the request thread.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
+
+
+class LogProvider:
+    """Writes notifications to the log; the default when nothing is configured."""
+
+    def send(self, recipient, messages):
+        for message in messages:
+            logger.info('Notification to %s: %s', recipient, message)
+
+
+class FakeProvider:
+    """Keeps sent batches in memory. ``fail_times`` makes the next N sends raise."""
+
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self._lock = threading.Lock()
+
+    def send(self, recipient, messages):
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError('fake provider failure')
+            self.sent.append((recipient, list(messages)))
+
+
+class TwilioSMSProvider:
+    """Sends one SMS per recipient batch through Twilio.
+
+    ``recipients`` maps outbox recipient keys (``role:lab_staff``,
+    ``user:<id>``) to lists of phone numbers; unmapped keys are skipped.
+    """
+
+    def __init__(self, account_sid, auth_token, from_number, recipients):
+        from twilio.rest import Client
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+        self.recipients = recipients
+
+    def send(self, recipient, messages):
+        numbers = self.recipients.get(recipient, [])
+        if not numbers:
+            logger.info('No phone number configured for %s; dropping %d message(s)', recipient, len(messages))
+            return
+        body = messages[0] if len(messages) == 1 else '\n'.join(
+            [f'{len(messages)} updates:'] + [f'- {message}' for message in messages])
+        for number in numbers:
+            self.client.messages.create(to=number, from_=self.from_number, body=body[:1600])
+
+
+def provider_from_config(config):
+    name = config.get('NOTIFICATION_PROVIDER', 'log')
+    if name == 'twilio':
+        return TwilioSMSProvider(
+            config['TWILIO_ACCOUNT_SID'],
+            config['TWILIO_AUTH_TOKEN'],
+            config['TWILIO_FROM_NUMBER'],
+            json.loads(config.get('NOTIFICATION_RECIPIENTS') or '{}'),
+        )
+    if name == 'fake':
+        return FakeProvider()
+    return LogProvider()
+
+
+class NotificationDispatcher:
+    def __init__(self, db, model, provider=None, workers=1, batch_size=50,
+                 max_attempts=5, base_delay=30, poll_interval=2, lease=300):
+        self.app = None
+        self.db = db
+        self.model = model
+        self.provider = provider
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.provider = provider_from_config(app.config)
+        self.workers = app.config.get('NOTIFICATION_WORKERS', self.workers)
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self.run_forever, name=f'notifications-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def run_forever(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    sent = self.run_once()
+            except Exception:
+                logger.exception('Notification dispatch failed')
+                sent = 0
+            if not sent:
+                time.sleep(self.poll_interval)
+
+    def _claim(self):
+        Outbox, session = self.model, self.db.session
+        now = datetime.utcnow()
+        candidates = [row_id for row_id, in session.query(Outbox.id).filter(or_(
+            (Outbox.status == 'pending') & (Outbox.next_attempt_at <= now),
+            # Rows left 'sending' by a worker that died mid-batch
+            (Outbox.status == 'sending') & (Outbox.locked_at < now - self.lease),
+        )).order_by(Outbox.id).limit(self.batch_size)]
+        if not candidates:
+            return []
+        token = uuid.uuid4().hex
+        session.query(Outbox).filter(
+            Outbox.id.in_(candidates),
+            or_(Outbox.status == 'pending', Outbox.locked_at < now - self.lease)
+        ).update({'status': 'sending', 'claim_token': token, 'locked_at': now}, synchronize_session=False)
+        session.commit()
+        return session.query(Outbox).filter(Outbox.claim_token == token).order_by(Outbox.id).all()
+
+    def run_once(self):
+        """Deliver one batch of due notifications; returns the number handled."""
+        rows = self._claim()
+        by_recipient = {}
+        for row in rows:
+            by_recipient.setdefault(row.recipient, []).append(row)
+
+        now = datetime.utcnow()
+        for recipient, batch in by_recipient.items():
+            try:
+                self.provider.send(recipient, [row.message for row in batch])
+            except Exception as e:
+                for row in batch:
+                    row.attempts += 1
+                    row.last_error = str(e)[:500]
+                    if row.attempts >= self.max_attempts:
+                        row.status = 'failed'
+                    else:
+                        delay = self.base_delay * 2 ** (row.attempts - 1)
+                        row.status = 'pending'
+                        row.next_attempt_at = now + timedelta(seconds=delay * random.uniform(1, 1.25))
+            else:
+                for row in batch:
+                    row.status = 'sent'
+                    row.sent_at = now
+        self.db.session.commit()
+        return len(rows)
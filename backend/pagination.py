@@ -0,0 +1,76 @@
+"""Keyset cursors and conditional GET helpers for list endpoints."""
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from flask import request
+
+DEFAULT_MAX_LIMIT = 500
+
+
+def encode_cursor(*values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, *types):
+    """Decode a cursor made by ``encode_cursor``.
+
+    ``types`` gives the expected type of each value (``datetime`` values
+    are parsed from ISO format). Raises ``ValueError`` on malformed input.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Invalid cursor')
+    try:
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def page_args(max_limit=DEFAULT_MAX_LIMIT):
+    """Return ``(limit, cursor)`` from the query string; limit is None when absent."""
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor') or None
+    if limit is None:
+        return None, cursor
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    return min(limit, max_limit), cursor
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return digest[:32]
+
+
+def not_modified(etag, last_modified=None):
+    """True if the client's cached copy (If-None-Match / If-Modified-Since) is current."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def set_validators(response, etag, last_modified=None, next_cursor=None):
+    # A compressed body is a different representation of the same data,
+    # so only a weak validator applies (as nginx does when it gzips)
+    response.set_etag(etag, weak=bool(response.content_encoding))
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients may reuse their copy but must revalidate it every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,48 @@
+"""Streaming quantile sketch.
+
+``QuantileSketch`` counts values in buckets whose bounds grow by a
+constant factor (the DDSketch layout), so its size depends on the spread
+of the values rather than on how many there are, and every quantile it
+reports is within ``relative_accuracy`` of the exact nearest-rank value.
+Sketches with the same accuracy merge by adding bucket counts. Values
+below 1 (zero-second durations) share one bucket reported as 0.
+"""
+import math
+
+# Values >= 1 land in buckets 0 and up, so negative keys are free
+ZERO_KEY = -1
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+
+    def add(self, value):
+        # Bucket i holds (gamma^(i-1), gamma^i]
+        key = math.ceil(math.log(value) / self._log_gamma) if value >= 1 else ZERO_KEY
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def quantile(self, q):
+        """Nearest-rank ``q``-quantile (0 < q <= 1), or None when empty."""
+        count = self.count
+        if not count:
+            return None
+        rank = max(1, math.ceil(q * count))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank <= seen:
+                if key == ZERO_KEY:
+                    return 0
+                # Midpoint, in relative terms, of the bucket's bounds
+                return 2 * self.gamma ** key / (self.gamma + 1)
@@ -0,0 +1,261 @@
+"""In-memory trigram/prefix index over the room directory.
+
+Used by the critical call search so a keystroke does not turn into a
+full ``ilike('%q%')`` table scan. Matching keeps the old substring
+semantics; results are ranked exact > prefix > word prefix > substring,
+then alphabetically by the matched value.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+# Fields searched for each critical call ``type`` filter. Unknown types
+# fall back to 'all', same as the old query chain.
+SEARCH_FIELDS = {
+    'ward': ('ward_name',),
+    'room': ('room_number',),
+    'patient': ('patient_id', 'patient_name'),
+    'nurse': ('primary_nurse_name', 'backup_nurse_name'),
+    'all': ('room_number', 'patient_id', 'patient_name', 'primary_nurse_name', 'backup_nurse_name'),
+}
+
+INDEXED_FIELDS = ('ward_name', 'room_number', 'patient_id', 'patient_name',
+                  'primary_nurse_name', 'backup_nurse_name')
+
+GRAM_SIZE = 3
+
+# Scopes (e.g. a single ward) smaller than this are ranked by checking
+# every room instead of walking the global sorted lists.
+SMALL_SCOPE = 2000
+
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def _grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _rank(value, q):
+    if value == q:
+        return RANK_EXACT
+    if value.startswith(q):
+        return RANK_PREFIX
+    if (' ' + q) in value:
+        return RANK_WORD_PREFIX
+    if q in value:
+        return RANK_SUBSTRING
+    return None
+
+
+class RoomSearchIndex:
+    """Sorted prefix lists and trigram postings for every room.
+
+    Each document keeps the room's response row (returned as-is by
+    ``search``) and the lower-cased values of the indexed fields.
+    ``_prefixes`` holds ``(value, room_id, field)`` and ``_words`` the same
+    for every word after the first. Both lists are append-only between
+    searches and re-sorted lazily; entries left behind by an update are
+    re-checked against the current value and compacted once they pile up.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._values = {}
+        self._ward_of = {}
+        self._grams = {}
+        self._by_ward = {}
+        self._prefixes = []
+        self._words = []
+        self._unsorted = False
+        self._stale = 0
+        self.loaded = False
+        # Directory version the index was last refreshed at (set by the caller)
+        self.version = None
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def needs_refresh(self, max_age):
+        """Return True at most once per ``max_age`` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if self.loaded and now - self._checked_at < max_age:
+                return False
+            self._checked_at = now
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._values.clear()
+            self._ward_of.clear()
+            self._grams.clear()
+            self._by_ward.clear()
+            self._prefixes = []
+            self._words = []
+            self._unsorted = False
+            self._stale = 0
+            self.loaded = False
+            self.version = None
+            self._checked_at = 0.0
+
+    def upsert(self, row, ward_id):
+        room_id = row['id']
+        values = {}
+        for field in INDEXED_FIELDS:
+            value = row.get(field)
+            if value is not None:
+                values[field] = str(value).lower()
+
+        with self._lock:
+            old = self._values.get(room_id)
+            if old == values and self._ward_of.get(room_id) == ward_id:
+                self._rows[room_id] = row
+            else:
+                self._discard(room_id)
+                self._rows[room_id] = row
+                self._values[room_id] = values
+                self._ward_of[room_id] = ward_id
+                self._by_ward.setdefault(ward_id, set()).add(room_id)
+                for field, value in values.items():
+                    self._prefixes.append((value, room_id, field))
+                    for word in value.split()[1:]:
+                        self._words.append((word, room_id, field))
+                    for gram in _grams(value):
+                        self._grams.setdefault(gram, set()).add(room_id)
+                self._unsorted = True
+
+    def upsert_many(self, entries):
+        """``entries`` is an iterable of ``(row, ward_id)``."""
+        with self._lock:
+            for row, ward_id in entries:
+                self.upsert(row, ward_id)
+            self.loaded = True
+
+    def reload(self, entries):
+        """Replace every document with ``entries``. The new index is built
+        aside, so searches see the old documents until it is swapped in."""
+        fresh = RoomSearchIndex()
+        fresh.upsert_many(entries)
+        with self._lock:
+            for name in ('_rows', '_values', '_ward_of', '_grams', '_by_ward',
+                         '_prefixes', '_words', '_unsorted', '_stale'):
+                setattr(self, name, getattr(fresh, name))
+            self.loaded = True
+
+    def _discard(self, room_id):
+        values = self._values.pop(room_id, None)
+        if values is None:
+            return
+        self._rows.pop(room_id, None)
+        ward_id = self._ward_of.pop(room_id, None)
+        members = self._by_ward.get(ward_id)
+        if members is not None:
+            members.discard(room_id)
+        for value in values.values():
+            self._stale += 1 + len(value.split()[1:])
+            for gram in _grams(value):
+                postings = self._grams.get(gram)
+                if postings is not None:
+                    postings.discard(room_id)
+                    if not postings:
+                        del self._grams[gram]
+
+    def _prepare(self):
+        if self._stale > (len(self._prefixes) + len(self._words)) // 4:
+            self._prefixes = []
+            self._words = []
+            for room_id, values in self._values.items():
+                for field, value in values.items():
+                    self._prefixes.append((value, room_id, field))
+                    for word in value.split()[1:]:
+                        self._words.append((word, room_id, field))
+            self._stale = 0
+            self._unsorted = True
+        if self._unsorted:
+            self._prefixes.sort()
+            self._words.sort()
+            self._unsorted = False
+
+    def _substring_candidates(self, q):
+        if len(q) < GRAM_SIZE:
+            return self._rows.keys()
+        postings = []
+        for gram in _grams(q):
+            ids = self._grams.get(gram)
+            if not ids:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _best_match(self, room_id, q, fields):
+        values = self._values.get(room_id)
+        if values is None:
+            return None
+        best = None
+        for field in fields:
+            value = values.get(field)
+            if value is None:
+                continue
+            rank = _rank(value, q)
+            if rank is not None and (best is None or (rank, value) < best):
+                best = (rank, value)
+        return best
+
+    def _rank_all(self, room_ids, q, fields, limit):
+        ranked = []
+        for room_id in room_ids:
+            best = self._best_match(room_id, q, fields)
+            if best is not None:
+                ranked.append((best[0], best[1], room_id))
+        return [room_id for _, _, room_id in heapq.nsmallest(limit, ranked)]
+
+    def _scan_sorted(self, entries, q, fields, check, in_scope, found, limit):
+        i = bisect.bisect_left(entries, (q,))
+        while i < len(entries) and len(found) < limit:
+            term, room_id, field = entries[i]
+            if not term.startswith(q):
+                break
+            i += 1
+            if room_id in found or field not in fields or not in_scope(room_id):
+                continue
+            value = self._values.get(room_id, {}).get(field)
+            if value is not None and check(value):
+                found[room_id] = None
+
+    def search(self, q, search_type='all', ward_id=None, limit=50):
+        fields = SEARCH_FIELDS.get(search_type, SEARCH_FIELDS['all'])
+        q = q.lower()
+        with self._lock:
+            if ward_id is None:
+                in_scope = lambda room_id: True
+            else:
+                scope = self._by_ward.get(ward_id, ())
+                if len(scope) <= SMALL_SCOPE:
+                    return [self._rows[i] for i in self._rank_all(scope, q, fields, limit)]
+                in_scope = scope.__contains__
+
+            self._prepare()
+            # Dict keeps insertion order: exact/prefix tier, then word
+            # prefix tier, then substring matches.
+            found = {}
+            self._scan_sorted(self._prefixes, q, fields, lambda v: v.startswith(q), in_scope, found, limit)
+            self._scan_sorted(self._words, q, fields, lambda v: (' ' + q) in v, in_scope, found, limit)
+            if len(found) < limit:
+                rest = (room_id for room_id in self._substring_candidates(q)
+                        if room_id not in found and in_scope(room_id))
+                for room_id in self._rank_all(rest, q, fields, limit - len(found)):
+                    found[room_id] = None
+            return [self._rows[room_id] for room_id in found]
@@ -0,0 +1,45 @@
+"""Column-projecting serializers for list endpoints.
+
+A serializer declares the response keys, the column each key is read
+from and the joins needed to reach those columns. ``query`` selects just
+those columns in a single statement, so listing N rows never triggers
+per-row relationship loads.
+"""
+from collections import namedtuple
+
+Join = namedtuple('Join', 'target onclause outer')
+Join.__new__.__defaults__ = (False,)
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+class ListSerializer:
+    def __init__(self, model, fields, joins=()):
+        """``fields`` is a list of ``(key, column)`` or ``(key, column, formatter)``."""
+        self.model = model
+        self.joins = tuple(joins)
+        self.keys = []
+        self.columns = []
+        self.formatters = []
+        for field in fields:
+            key, column = field[0], field[1]
+            self.keys.append(key)
+            self.columns.append(column.label(key))
+            self.formatters.append(field[2] if len(field) > 2 else None)
+
+    def query(self, session):
+        query = session.query(*self.columns).select_from(self.model)
+        for join in self.joins:
+            query = query.join(join.target, join.onclause, isouter=join.outer)
+        return query
+
+    def dump(self, row):
+        return {
+            key: fmt(value) if fmt else value
+            for key, value, fmt in zip(self.keys, row, self.formatters)
+        }
+
+    def dump_all(self, rows):
+        return [self.dump(row) for row in rows]
@@ -0,0 +1,155 @@
+"""Streaming JSON array responses for list endpoints.
+
+``json_list_response`` encodes rows as they come off the cursor instead of
+building the whole list for ``jsonify``, so peak memory stays flat and
+the first bytes leave before the last row is read. The body is
+byte-for-byte what ``jsonify`` produces in its default (non-debug)
+configuration: sorted keys, compact separators, ASCII-escaped strings
+and a trailing newline. Rows are encoded with orjson when it is
+installed, and the body is compressed with brotli or gzip when the
+client accepts it.
+
+``cached_json_list_response`` sends the same body from a cache instead,
+keeping one copy per content encoding. ``stream_response`` streams
+any other byte chunks with the same compression.
+"""
+import json
+import time
+import zlib
+
+from flask import current_app, jsonify, request, stream_with_context
+
+from metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Rows encoded per chunk written to the socket (and compressor flush)
+CHUNK_ROWS = 200
+
+
+def _stdlib_dumps(value):
+    return json.dumps(value, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode()
+
+
+if orjson is not None:
+    def encode_row(value):
+        data = orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        # orjson writes non-ASCII characters and DEL unescaped; json.dumps
+        # (and so jsonify) escapes them
+        if not data.isascii() or b'\x7f' in data:
+            return _stdlib_dumps(value)
+        return data
+else:
+    encode_row = _stdlib_dumps
+
+
+def _json_chunks(rows, dump):
+    parts = [b'[']
+    encoding_time, count = 0.0, 0
+    for i, row in enumerate(rows):
+        if i:
+            parts.append(b',')
+        start = time.perf_counter()
+        parts.append(encode_row(dump(row)))
+        encoding_time += time.perf_counter() - start
+        count += 1
+        if len(parts) >= 2 * CHUNK_ROWS:
+            record_serialization(encoding_time, count)
+            encoding_time, count = 0.0, 0
+            yield b''.join(parts)
+            parts = []
+    record_serialization(encoding_time, count)
+    parts.append(b']\n')
+    yield b''.join(parts)
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def _jsonify_is_compact(provider):
+    compact = provider.compact if provider.compact is not None else not current_app.debug
+    return compact and provider.sort_keys and provider.ensure_ascii
+
+
+def json_list_response(rows, dump=None):
+    """Stream ``[dump(row) for row in rows]`` as a JSON array.
+
+    ``rows`` may be a query (use ``yield_per`` for a server-side cursor)
+    or any iterable. Values must be JSON-native (str, int, bool, None);
+    formatters should already have turned datetimes into strings.
+    """
+    app = current_app
+    dump = dump or (lambda row: row)
+    if not _jsonify_is_compact(app.json):
+        # Debug pretty-printing: keep jsonify's exact formatting
+        return jsonify([dump(row) for row in rows])
+
+    return stream_response(_json_chunks(rows, dump), app.json.mimetype)
+
+
+def stream_response(chunks, mimetype):
+    """Stream byte ``chunks``, compressed when the client accepts it."""
+    encoding = _negotiate_encoding()
+    if encoding:
+        chunks = _compress(chunks, encoding)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    return response
+
+
+def cached_json_list_response(cache_get, key, load_rows, dump=None):
+    """Send the body ``json_list_response`` would, built once per ``key``.
+
+    ``cache_get(key, load)`` is a read-through cache lookup (such as
+    ``TTLCache.get``) and ``load_rows()`` returns the rows on a miss. The
+    compressed body is cached next to the plain one under ``key + (encoding,)``.
+    """
+    app = current_app
+    dump = dump or (lambda row: row)
+    if not _jsonify_is_compact(app.json):
+        return json_list_response(load_rows(), dump)
+
+    def plain(_):
+        return b''.join(_json_chunks(load_rows(), dump))
+
+    encoding = _negotiate_encoding()
+    if encoding:
+        body = cache_get(key + (encoding,), lambda _: b''.join(_compress([cache_get(key, plain)], encoding)))
+    else:
+        body = cache_get(key, plain)
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+    return response
@@ -0,0 +1,29 @@
+"""Shared fixtures. Tests run from the ``backend`` directory: ``python -m pytest tests``."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """A bootstrapped app on an empty in-memory database."""
+    app = module.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'DIRECTORY_CACHE_PATH': '',
+        'IDENTITY_CACHE_TTL': 0,
+        'SEARCH_INDEX_REFRESH_SECONDS': 0,
+        'METRICS_ENABLED': False,
+        'NOTIFICATION_WORKERS': 0,
+        'SHIFT_HANDOVER_SCHEDULER': False,
+    })
+    with app.app_context():
+        module.bootstrap()
+    # Module-level caches outlive the app; start each test cold
+    module.directory_cache.clear()
+    module.room_search_index.version = None
+    return app
@@ -0,0 +1,78 @@
+"""List endpoints run a fixed number of SQL statements however many rows they return."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app as module
+
+ROOMS_PER_WARD = 10
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['access_token']}"
+    return client
+
+
+def add_wards(app, count):
+    """Add ``count`` wards with their rooms and one add-on request per room."""
+    now = datetime.utcnow().replace(microsecond=0)
+    with app.app_context():
+        db = module.db
+        admin_id = db.session.query(module.User.id).filter_by(username='admin').scalar()
+        for _ in range(count):
+            ward = module.Ward(name=f'Ward {db.session.query(module.Ward).count() + 1}')
+            db.session.add(ward)
+            db.session.flush()
+            for number in range(ROOMS_PER_WARD):
+                room_number = str(100 + number)
+                db.session.add(module.Room(
+                    ward_id=ward.id, room_number=room_number, patient_name=f'Patient {ward.id}-{number}',
+                    patient_id=f'P{ward.id}{number:03}', primary_nurse_name='Sam Nurse',
+                    primary_nurse_extension='1234', charge_nurse_name='Alex Charge', shift_type='day',
+                    updated_at=now))
+                category, preventable = module.reason_classifier.classify('Clinical change')
+                db.session.add(module.AddOnRequest(
+                    ward_id=ward.id, room_number=room_number, patient_id=f'P{ward.id}{number:03}',
+                    requested_test='CBC', reason='Clinical change', reason_category=category,
+                    preventable=preventable, requested_by=admin_id,
+                    created_at=now - timedelta(minutes=number)))
+        module.bump_directory_version(now)
+        db.session.commit()
+
+
+def count_statements(app, client, url):
+    """Return (statements executed, rows returned) for a GET of ``url``."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    module.directory_cache.clear()
+    with app.app_context():
+        engine = module.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), len(response.get_json())
+
+
+@pytest.mark.parametrize('url', [
+    '/api/rooms',
+    '/api/addon-requests',
+    '/api/critical-call/search?q=patient&type=patient',
+])
+def test_statement_count_does_not_grow_with_rows(app, client, url):
+    add_wards(app, 1)
+    statements, rows = count_statements(app, client, url)
+    add_wards(app, 3)
+    more_statements, more_rows = count_statements(app, client, url)
+
+    assert more_rows > rows
+    assert more_statements == statements
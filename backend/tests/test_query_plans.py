@@ -0,0 +1,12 @@
+"""Hot queries are planned without full table scans (the check behind `flask check-query-plans`)."""
+import app as module
+from migrations import full_table_scans
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        with module.db.engine.connect() as connection:
+            scans = {name: full_table_scans(connection, query.statement)
+                     for name, query in module._hot_queries().items()}
+
+    assert {name: tables for name, tables in scans.items() if tables} == {}
@@ -9,6 +9,8 @@ const COLORS = ['#0ea5e9', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899'
 export default function Analytics() {
   const [stats, setStats] = useState(null)
   const [trends, setTrends] = useState(null)
+  const [turnaround, setTurnaround] = useState(null)
+  const [turnaroundGroup, setTurnaroundGroup] = useState('ward')
   const [loading, setLoading] = useState(false)
   const [dateRange, setDateRange] = useState({ start: '', end: '' })
 
@@ -24,8 +26,12 @@ export default function Analytics() {
       if (dateRange.start) params.start_date = dateRange.start
       if (dateRange.end) params.end_date = dateRange.end
       
-      const response = await api.get('/analytics/addon-stats', { params })
+      const [response, turnaroundResponse] = await Promise.all([
+        api.get('/analytics/addon-stats', { params }),
+        api.get('/analytics/addon-turnaround', { params })
+      ])
       setStats(response.data)
+      setTurnaround(turnaroundResponse.data)
     } catch (error) {
       toast.error('Failed to load statistics')
     } finally {
@@ -91,6 +97,14 @@ export default function Analytics() {
       count
     })) : []
 
+  const formatMinutes = (seconds) => seconds == null ? '-' : `${Math.round(seconds / 60)} min`
+
+  const turnaroundRows = turnaround ? [
+    ['All requests', turnaround.overall],
+    ...Object.entries(turnaround[`by_${turnaroundGroup}`])
+      .sort((a, b) => (b[1].review.p90 ?? 0) - (a[1].review.p90 ?? 0))
+  ] : []
+
   return (
     <Layout>
       <div className="space-y-6">
@@ -244,6 +258,53 @@ export default function Analytics() {
               </div>
             )}
 
+            {/* Turnaround Times */}
+            {turnaround && (
+              <div className="bg-white rounded-lg shadow p-6">
+                <div className="flex justify-between items-center mb-4">
+                  <h2 className="text-xl font-bold text-gray-900">Turnaround Times</h2>
+                  <select
+                    value={turnaroundGroup}
+                    onChange={(e) => setTurnaroundGroup(e.target.value)}
+                    className="px-3 py-2 border border-gray-300 rounded-lg text-sm"
+                  >
+                    <option value="ward">By ward</option>
+                    <option value="test">By test</option>
+                    <option value="urgency">By urgency</option>
+                    <option value="shift">By shift</option>
+                  </select>
+                </div>
+                <div className="overflow-x-auto">
+                  <table className="min-w-full divide-y divide-gray-200">
+                    <thead className="bg-gray-50">
+                      <tr>
+                        <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Group</th>
+                        <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Reviewed</th>
+                        <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Review p50 / p90 / p99</th>
+                        <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Completed</th>
+                        <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Complete p50 / p90 / p99</th>
+                      </tr>
+                    </thead>
+                    <tbody className="bg-white divide-y divide-gray-200">
+                      {turnaroundRows.map(([group, row], index) => (
+                        <tr key={group} className={index === 0 ? 'font-semibold' : ''}>
+                          <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{group}</td>
+                          <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{row.review.count}</td>
+                          <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
+                            {formatMinutes(row.review.p50)} / {formatMinutes(row.review.p90)} / {formatMinutes(row.review.p99)}
+                          </td>
+                          <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{row.complete.count}</td>
+                          <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
+                            {formatMinutes(row.complete.p50)} / {formatMinutes(row.complete.p90)} / {formatMinutes(row.complete.p99)}
+                          </td>
+                        </tr>
+                      ))}
+                    </tbody>
+                  </table>
+                </div>
+              </div>
+            )}
+
             {/* Top Requesters */}
             {userData.length > 0 && (
               <div className="bg-white rounded-lg shadow p-6">
@@ -8,7 +8,9 @@ export default function Dashboard() {
   const { user } = useAuth()
   const [stats, setStats] = useState({
     totalRooms: 0,
+    roomsStaffed: 0,
     pendingRequests: 0,
+    urgentPending: 0,
     todayRequests: 0,
     completedToday: 0
   })
@@ -19,24 +21,14 @@ export default function Dashboard() {
 
   const fetchStats = async () => {
     try {
-      const [roomsRes, requestsRes] = await Promise.all([
-        api.get('/rooms'),
-        api.get('/addon-requests')
-      ])
-      
-      const today = new Date().toISOString().split('T')[0]
-      const todayRequests = requestsRes.data.filter(r => 
-        r.created_at.startsWith(today)
-      )
-      const completedToday = requestsRes.data.filter(r => 
-        r.status === 'completed' && r.completed_at?.startsWith(today)
-      )
-
+      const { data } = await api.get('/dashboard/summary')
       setStats({
-        totalRooms: roomsRes.data.length,
-        pendingRequests: requestsRes.data.filter(r => r.status === 'pending').length,
-        todayRequests: todayRequests.length,
-        completedToday: completedToday.length
+        totalRooms: data.total_rooms,
+        roomsStaffed: data.rooms_staffed,
+        pendingRequests: data.pending_requests,
+        urgentPending: data.urgent_pending,
+        todayRequests: data.today_requests,
+        completedToday: data.completed_today
       })
     } catch (error) {
       console.error('Error fetching stats:', error)
@@ -100,6 +92,7 @@ export default function Dashboard() {
               <div>
                 <p className="text-sm font-medium text-gray-600">Total Rooms</p>
                 <p className="text-3xl font-bold text-gray-900 mt-2">{stats.totalRooms}</p>
+                <p className="text-xs text-gray-500 mt-1">{stats.roomsStaffed} staffed</p>
               </div>
               <div className="text-4xl">🏥</div>
             </div>
@@ -110,6 +103,7 @@ export default function Dashboard() {
               <div>
                 <p className="text-sm font-medium text-gray-600">Pending Requests</p>
                 <p className="text-3xl font-bold text-yellow-600 mt-2">{stats.pendingRequests}</p>
+                <p className="text-xs text-gray-500 mt-1">{stats.urgentPending} urgent</p>
               </div>
               <div className="text-4xl">⏳</div>
             </div>
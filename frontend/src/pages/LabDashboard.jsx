@@ -3,8 +3,11 @@ import Layout from '../components/Layout'
 import api from '../services/api'
 import toast from 'react-hot-toast'
 
+const PAGE_SIZE = 100
+
 export default function LabDashboard() {
   const [requests, setRequests] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [filter, setFilter] = useState('pending')
   const [selectedRequest, setSelectedRequest] = useState(null)
   const [showApproveModal, setShowApproveModal] = useState(false)
@@ -12,28 +15,85 @@ export default function LabDashboard() {
   const [approvalAction, setApprovalAction] = useState('')
   const [rejectionReason, setRejectionReason] = useState('')
   const [loading, setLoading] = useState(false)
+  const [selectedIds, setSelectedIds] = useState([])
+  const [bulkMode, setBulkMode] = useState(false)
 
   useEffect(() => {
+    setSelectedIds([])
     fetchRequests()
   }, [filter])
 
-  const fetchRequests = async () => {
+  const fetchRequests = async (cursor = null) => {
     try {
       const response = await api.get('/addon-requests', {
-        params: { status: filter === 'all' ? '' : filter }
+        params: {
+          status: filter === 'all' ? '' : filter,
+          limit: PAGE_SIZE,
+          ...(cursor && { cursor })
+        }
       })
-      setRequests(response.data)
+      setRequests(cursor ? (prev) => [...prev, ...response.data] : response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
     } catch (error) {
       toast.error('Failed to load requests')
     }
   }
 
+  const selectable = (request) => request.status === 'pending' || request.status === 'approved'
+
+  const toggleSelected = (id) => {
+    setSelectedIds((prev) => (prev.includes(id) ? prev.filter((x) => x !== id) : [...prev, id]))
+  }
+
+  const selectedWithStatus = (status) =>
+    requests.filter((request) => selectedIds.includes(request.id) && request.status === status)
+
+  // One POST /addon-requests/batch for all selected requests
+  const runBatch = async (operations) => {
+    setLoading(true)
+    try {
+      const response = await api.post('/addon-requests/batch', { operations })
+      const { applied, failed, results } = response.data
+      if (applied) {
+        toast.success(`${applied} request${applied === 1 ? '' : 's'} updated`)
+      }
+      if (failed) {
+        const firstError = results.find((result) => result.status !== 200)
+        toast.error(`${failed} failed: #${firstError.id} ${firstError.error}`)
+      }
+      setSelectedIds([])
+      fetchRequests()
+      return true
+    } catch (error) {
+      toast.error('Failed to update requests')
+      return false
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  const closeBulk = () => {
+    setBulkMode(false)
+    setShowApproveModal(false)
+    setShowRejectModal(false)
+    setApprovalAction('')
+    setRejectionReason('')
+  }
+
   const handleApprove = async () => {
     if (!approvalAction) {
       toast.error('Please select an action')
       return
     }
 
+    if (bulkMode) {
+      const operations = selectedWithStatus('pending').map((request) => ({
+        id: request.id, action: 'approve', payload: { action: approvalAction }
+      }))
+      if (await runBatch(operations)) closeBulk()
+      return
+    }
+
     setLoading(true)
     try {
       await api.post(`/addon-requests/${selectedRequest.id}/approve`, {
@@ -57,6 +117,14 @@ export default function LabDashboard() {
       return
     }
 
+    if (bulkMode) {
+      const operations = selectedWithStatus('pending').map((request) => ({
+        id: request.id, action: 'reject', payload: { reason: rejectionReason }
+      }))
+      if (await runBatch(operations)) closeBulk()
+      return
+    }
+
     setLoading(true)
     try {
       await api.post(`/addon-requests/${selectedRequest.id}/reject`, {
@@ -87,6 +155,10 @@ export default function LabDashboard() {
     }
   }
 
+  const handleBulkComplete = () => {
+    runBatch(selectedWithStatus('approved').map((request) => ({ id: request.id, action: 'complete' })))
+  }
+
   const getStatusBadge = (status) => {
     const badges = {
       pending: 'bg-yellow-100 text-yellow-800',
@@ -131,12 +203,65 @@ export default function LabDashboard() {
           </div>
         </div>
 
+        {/* Bulk Actions */}
+        {selectedIds.length > 0 && (
+          <div className="bg-white rounded-lg shadow p-4 flex items-center space-x-3">
+            <span className="text-sm text-gray-700">{selectedIds.length} selected</span>
+            {selectedWithStatus('pending').length > 0 && (
+              <>
+                <button
+                  onClick={() => {
+                    setBulkMode(true)
+                    setShowApproveModal(true)
+                  }}
+                  disabled={loading}
+                  className="px-3 py-1 bg-green-600 text-white rounded-lg hover:bg-green-700 disabled:opacity-50"
+                >
+                  Approve {selectedWithStatus('pending').length}
+                </button>
+                <button
+                  onClick={() => {
+                    setBulkMode(true)
+                    setShowRejectModal(true)
+                  }}
+                  disabled={loading}
+                  className="px-3 py-1 bg-red-600 text-white rounded-lg hover:bg-red-700 disabled:opacity-50"
+                >
+                  Reject {selectedWithStatus('pending').length}
+                </button>
+              </>
+            )}
+            {selectedWithStatus('approved').length > 0 && (
+              <button
+                onClick={handleBulkComplete}
+                disabled={loading}
+                className="px-3 py-1 bg-blue-600 text-white rounded-lg hover:bg-blue-700 disabled:opacity-50"
+              >
+                Complete {selectedWithStatus('approved').length}
+              </button>
+            )}
+            <button
+              onClick={() => setSelectedIds([])}
+              className="px-3 py-1 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300"
+            >
+              Clear
+            </button>
+          </div>
+        )}
+
         {/* Requests List */}
         <div className="bg-white rounded-lg shadow overflow-hidden">
           <div className="overflow-x-auto">
             <table className="min-w-full divide-y divide-gray-200">
               <thead className="bg-gray-50">
                 <tr>
+                  <th className="px-6 py-3">
+                    <input
+                      type="checkbox"
+                      checked={requests.some(selectable) && requests.filter(selectable).every((r) => selectedIds.includes(r.id))}
+                      onChange={(e) => setSelectedIds(e.target.checked ? requests.filter(selectable).map((r) => r.id) : [])}
+                    />
+                  </th>
                   <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Ward</th>
                   <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Room</th>
                   <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Patient ID</th>
@@ -151,6 +276,15 @@ export default function LabDashboard() {
               <tbody className="bg-white divide-y divide-gray-200">
                 {requests.map((request) => (
                   <tr key={request.id} className="hover:bg-gray-50">
+                    <td className="px-6 py-4">
+                      {selectable(request) && (
+                        <input
+                          type="checkbox"
+                          checked={selectedIds.includes(request.id)}
+                          onChange={() => toggleSelected(request.id)}
+                        />
+                      )}
+                    </td>
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
                       {request.ward_name}
                     </td>
@@ -228,6 +362,17 @@ export default function LabDashboard() {
           </div>
         </div>
 
+        {nextCursor && (
+          <div className="text-center">
+            <button
+              onClick={() => fetchRequests(nextCursor)}
+              className="px-4 py-2 rounded-lg font-medium bg-gray-100 text-gray-700 hover:bg-gray-200"
+            >
+              Load more
+            </button>
+          </div>
+        )}
+
         {requests.length === 0 && (
           <div className="text-center py-12 bg-white rounded-lg shadow">
             <p className="text-gray-500">No requests found</p>
@@ -309,11 +454,13 @@ export default function LabDashboard() {
         )}
 
         {/* Approve Modal */}
-        {showApproveModal && selectedRequest && (
+        {showApproveModal && (selectedRequest || bulkMode) && (
           <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
             <div className="bg-white rounded-lg shadow-xl max-w-md w-full mx-4">
               <div className="p-6">
-                <h2 className="text-2xl font-bold text-gray-900 mb-4">Approve Request</h2>
+                <h2 className="text-2xl font-bold text-gray-900 mb-4">
+                  {bulkMode ? `Approve ${selectedWithStatus('pending').length} Requests` : 'Approve Request'}
+                </h2>
                 <div className="space-y-4">
                   <div>
                     <label className="block text-sm font-medium text-gray-700 mb-2">
@@ -334,6 +481,7 @@ export default function LabDashboard() {
                   <button
                     onClick={() => {
                       setShowApproveModal(false)
+                      setBulkMode(false)
                       setApprovalAction('')
                     }}
                     className="px-4 py-2 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300"
@@ -354,11 +502,13 @@ export default function LabDashboard() {
         )}
 
         {/* Reject Modal */}
-        {showRejectModal && selectedRequest && (
+        {showRejectModal && (selectedRequest || bulkMode) && (
           <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
             <div className="bg-white rounded-lg shadow-xl max-w-md w-full mx-4">
               <div className="p-6">
-                <h2 className="text-2xl font-bold text-gray-900 mb-4">Reject Request</h2>
+                <h2 className="text-2xl font-bold text-gray-900 mb-4">
+                  {bulkMode ? `Reject ${selectedWithStatus('pending').length} Requests` : 'Reject Request'}
+                </h2>
                 <div className="space-y-4">
                   <div>
                     <label className="block text-sm font-medium text-gray-700 mb-2">
@@ -387,6 +537,7 @@ export default function LabDashboard() {
                   <button
                     onClick={() => {
                       setShowRejectModal(false)
+                      setBulkMode(false)
                       setRejectionReason('')
                     }}
                     className="px-4 py-2 bg-gray-200 text-gray-700 rounded-lg hover:bg-gray-300"